@@ -0,0 +1,77 @@
+# Размер ответов и процессорное время на запрос со сжатием и без него.
+# python benchmarks/compression.py --requests 200 --json compression.json
+# Без DATABASE_URL используется временная база SQLite с каталогом из delive/data.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from flask import url_for
+
+from delive import app, db, importer
+from delive.models import Dish
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+
+def prepare():
+    with app.app_context():
+        db.create_all()
+        if not db.session.query(Dish).count():
+            importer.import_catalog(build_images=False)
+
+
+def measure(client, path, encoding, requests):
+    sizes = 0
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers={"Accept-Encoding": encoding})
+        sizes += len(response.data)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    return {
+        "path": path,
+        "encoding": encoding,
+        "content_encoding": response.headers.get("Content-Encoding", "identity"),
+        "bytes": sizes // requests,
+        "cpu_ms": round(cpu / requests * 1000, 3),
+        "wall_ms": round(elapsed / requests * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сжатие ответов: байты и время процессора на запрос")
+    parser.add_argument("--requests", type=int, default=100, help="запросов на каждый замер")
+    parser.add_argument("--paths", default="/,/cart/,/login/", help="адреса через запятую")
+    parser.add_argument("--json", help="файл для результатов в формате JSON")
+    args = parser.parse_args()
+
+    prepare()
+    client = app.test_client()
+    client.environ_base["HTTP_HOST"] = app.config["SERVER_NAME"]
+    with app.test_request_context():
+        paths = args.paths.split(",") + [url_for("static", filename="css/styles.css")]
+
+    results = []
+    print(f"{'адрес':<40} {'запрошено':>10} {'отдано':>9} {'байт':>8} {'CPU, мс':>8} {'время, мс':>10}")
+    for path in paths:
+        for encoding in ENCODINGS:
+            result = measure(client, path, encoding, args.requests)
+            results.append(result)
+            print(f"{path:<40} {encoding:>10} {result['content_encoding']:>9} {result['bytes']:>8} "
+                  f"{result['cpu_ms']:>8} {result['wall_ms']:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+# Нагрузочный тест: сценарии покупателей и администратора против локально запущенного gunicorn.
+# python benchmarks/seed.py --reset
+# python benchmarks/load_test.py --clients 16 --duration 60 --json results.json
+# Результат - задержки (p50/p95/p99), пропускная способность и число SQL-запросов по адресам в JSON,
+# который можно сравнивать между коммитами. База та же, что у seed.py (DATABASE_URL или benchmarks/bench.db).
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote, urlencode
+
+# seed задаёт DATABASE_URL по умолчанию, поэтому импортируется до приложения
+import seed
+
+from sqlalchemy import event, func
+
+from delive import app, db
+from delive.models import Category, Dish, Order, User
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+# доли сценариев покупателей по умолчанию
+MIX = "browse=50,cart=20,checkout=10,account=20"
+
+
+# Размер данных и диапазоны id для сценариев
+class Dataset:
+    def __init__(self):
+        self.categories = db.session.query(func.max(Category.id)).scalar() or 0
+        self.dishes = db.session.query(func.max(Dish.id)).scalar() or 0
+        self.users = db.session.query(func.max(User.id)).scalar() or 0
+        self.orders = db.session.query(func.max(Order.id)).scalar() or 0
+        if not self.dishes or self.users < 2:
+            sys.exit("В БД нет данных: сначала запустите benchmarks/seed.py")
+
+    def as_dict(self):
+        return {"categories": self.categories, "dishes": self.dishes, "users": self.users, "orders": self.orders}
+
+
+# HTTP-клиент с постоянным соединением и своими cookie (SERVER_NAME приложения передаётся в Host)
+class HttpClient:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.connection = None
+        self.cookies = {}
+
+    def request(self, method, path, form=None):
+        headers = {"Host": app.config["SERVER_NAME"], "Accept-Encoding": "gzip"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = None
+            raise
+
+        for header in response.msg.get_all("Set-Cookie") or []:
+            name, _, value = header.split(";", 1)[0].partition("=")
+            self.cookies[name.strip()] = value
+        if response.getheader("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        return response.status, data
+
+
+# Клиент внутри процесса (Flask test client): нужен для подсчёта SQL-запросов на адрес
+class AppClient:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None):
+        response = self.client.open(path, method=method, data=form, base_url=f"http://{app.config['SERVER_NAME']}")
+        return response.status_code, response.get_data()
+
+
+# Замеры по адресам: задержки, ответы по кодам, ошибки и число SQL-запросов
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, seconds, status, queries=None):
+        with self.lock:
+            entry = self.routes.setdefault(route, {"latencies": [], "statuses": {}, "errors": 0, "queries": []})
+            if seconds is not None:
+                entry["latencies"].append(seconds)
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+            if status == "error" or isinstance(status, int) and status >= 500:
+                entry["errors"] += 1
+            if queries is not None:
+                entry["queries"].append(queries)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))] * 1000, 1)
+
+
+def summary(latencies, errors, count, duration):
+    latencies = sorted(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "rps": round(count / duration, 1) if duration else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+    }
+
+
+# Сессия виртуального пользователя: каждый запрос записывается под именем адреса (шаблоном пути)
+class Session:
+    def __init__(self, client, stats, counter=None):
+        self.client = client
+        self.stats = stats
+        self.counter = counter
+        self.recording = True
+
+    def call(self, route, method, path, form=None):
+        queries_before = self.counter[0] if self.counter else None
+        started = time.perf_counter()
+        try:
+            status, data = self.client.request(method, path, form)
+        except (http.client.HTTPException, OSError):
+            if self.recording:
+                self.stats.add(route, None, "error")
+            return None, b""
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            self.stats.add(route, elapsed, status, self.counter[0] - queries_before if self.counter else None)
+        return status, data
+
+    def get(self, route, path):
+        return self.call(route, "GET", path)
+
+    def post(self, route, path, form):
+        return self.call(route, "POST", path, form)
+
+    def csrf_token(self, data):
+        match = CSRF_RE.search(data.decode("utf-8", "replace"))
+        return match.group(1) if match else ""
+
+    def login(self, email):
+        _, data = self.get("GET /login/", "/login/")
+        self.post("POST /login/", "/login/", {"csrf_token": self.csrf_token(data), "username": email,
+                                              "password": seed.PASSWORD})
+
+
+def browse(session, rng, dataset):
+    session.get("GET /", "/")
+    session.get("GET /search/", f"/search/?q={quote(rng.choice(seed.KINDS))}")
+    session.get("GET /api/v1/dishes/", f"/api/v1/dishes/?category={rng.randint(1, dataset.categories)}")
+
+
+def cart(session, rng, dataset):
+    for _ in range(rng.randint(1, 3)):
+        session.get("GET /addtocart/<id>/", f"/addtocart/{rng.randint(1, dataset.dishes)}/")
+    return session.get("GET /cart/", "/cart/")
+
+
+def checkout(session, rng, dataset):
+    _, data = cart(session, rng, dataset)
+    session.post("POST /cart/", "/cart/", {
+        "csrf_token": session.csrf_token(data), "clientName": "Покупатель", "clientPhone": "+79991234567",
+        "clientAdress": "ул. Ленина, д. 1, кв. 1", "clientEmail": session.email})
+
+
+def account(session, rng, dataset):
+    session.get("GET /account/", "/account/")
+
+
+def admin(session, rng, dataset):
+    session.get("GET /sadmin/order/", "/sadmin/order/")
+    session.get("GET /sadmin/order/?page=<n>", f"/sadmin/order/?page={rng.randint(1, 20)}")
+    session.get("GET /sadmin/dish/", "/sadmin/dish/")
+    session.get("GET /sadmin/user/", "/sadmin/user/")
+
+
+SCENARIOS = {"browse": browse, "cart": cart, "checkout": checkout, "account": account, "admin": admin}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            sys.exit(f"Неизвестный сценарий: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# Виртуальный пользователь: вход, затем сценарии по долям mix до остановки
+def virtual_user(session, rng, dataset, mix, stop, is_admin):
+    session.email = seed.ADMIN_EMAIL if is_admin else f"user{rng.randint(2, dataset.users)}@bench.test"
+    session.login(session.email)
+    names, weights = list(mix), list(mix.values())
+    while not stop.is_set():
+        scenario = "admin" if is_admin else rng.choices(names, weights)[0]
+        SCENARIOS[scenario](session, rng, dataset)
+
+
+def run_load(host, port, dataset, args):
+    stats = Stats()
+    stop = threading.Event()
+    mix = parse_mix(args.mix)
+    sessions = []
+    threads = []
+    for i in range(args.clients + args.admin_clients):
+        session = Session(HttpClient(host, port), stats)
+        session.recording = False
+        sessions.append(session)
+        threads.append(threading.Thread(target=virtual_user, daemon=True,
+                                        args=(session, random.Random(args.seed + i), dataset, mix, stop,
+                                              i >= args.clients)))
+    for thread in threads:
+        thread.start()
+
+    # первые warmup секунд (вход пользователей, прогрев кэшей) в замер не входят
+    time.sleep(args.warmup)
+    stats.routes.clear()
+    for session in sessions:
+        session.recording = True
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    stop.set()
+    duration = time.perf_counter() - started
+    for session in sessions:
+        session.recording = False
+    for thread in threads:
+        thread.join(timeout=60)
+    return stats, duration
+
+
+# Число SQL-запросов на адрес: каждый сценарий выполняется внутри процесса через test client
+def count_queries(dataset, args):
+    counter = [0]
+
+    def count(*_):
+        counter[0] += 1
+
+    stats = Stats()
+    with app.app_context():
+        engines = {db.engine} | {db.get_engine(app, bind) for bind in (app.config.get("SQLALCHEMY_BINDS") or {})}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    try:
+        rng = random.Random(args.seed)
+        for is_admin, scenarios in ((False, [name for name in SCENARIOS if name != "admin"]), (True, ["admin"])):
+            session = Session(AppClient(), stats, counter)
+            session.email = seed.ADMIN_EMAIL if is_admin else f"user{rng.randint(2, dataset.users)}@bench.test"
+            session.login(session.email)
+            # второй проход - с прогретыми кэшами процесса, как у работающего сервера
+            for _ in range(2):
+                for name in scenarios:
+                    SCENARIOS[name](session, rng, dataset)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count)
+    return {route: entry["queries"][-1] for route, entry in stats.routes.items() if entry["queries"]}
+
+
+def start_server(args):
+    env = dict(os.environ)
+    # gunicorn из того же окружения, что и python (у gunicorn 20 нет запуска через -m)
+    gunicorn = os.path.join(os.path.dirname(sys.executable), "gunicorn")
+    command = [gunicorn if os.path.exists(gunicorn) else "gunicorn", "app:app", "--bind", f"127.0.0.1:{args.port}",
+               "--workers", str(args.workers), "--worker-class", "gthread", "--threads", str(args.threads),
+               "--log-level", "warning"]
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"gunicorn завершился с кодом {server.returncode}")
+        try:
+            status, _ = HttpClient("127.0.0.1", args.port).request("GET", "/")
+            if status < 500:
+                return server
+        except (http.client.HTTPException, OSError, socket.timeout):
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    sys.exit("gunicorn не ответил за 60 с")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сайта на синтетических данных")
+    parser.add_argument("--clients", type=int, default=16, help="одновременных покупателей")
+    parser.add_argument("--admin-clients", type=int, default=1, help="одновременных администраторов")
+    parser.add_argument("--mix", default=MIX, help="доли сценариев покупателей: имя=вес через запятую")
+    parser.add_argument("--duration", type=float, default=60, help="длительность замера, с")
+    parser.add_argument("--warmup", type=float, default=10, help="прогрев перед замером, с")
+    parser.add_argument("--workers", type=int, default=2, help="процессов gunicorn")
+    parser.add_argument("--threads", type=int, default=16, help="потоков в процессе gunicorn")
+    parser.add_argument("--port", type=int, default=8765, help="порт gunicorn")
+    parser.add_argument("--url", help="адрес уже запущенного сервера (host:port) вместо запуска gunicorn")
+    parser.add_argument("--seed", type=int, default=1, help="начальное значение генератора случайных чисел")
+    parser.add_argument("--no-queries", action="store_true", help="не считать SQL-запросы по адресам")
+    parser.add_argument("--json", help="файл для результатов в формате JSON")
+    args = parser.parse_args()
+    started = datetime.utcnow()
+
+    with app.app_context():
+        dataset = Dataset()
+        database = db.engine.dialect.name
+
+    server = None
+    if args.url:
+        host, _, port = args.url.partition(":")
+        port = int(port or 80)
+    else:
+        host, port = "127.0.0.1", args.port
+        server = start_server(args)
+    try:
+        stats, duration = run_load(host, port, dataset, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    queries = {} if args.no_queries else count_queries(dataset, args)
+
+    routes = {}
+    all_latencies = []
+    errors = 0
+    count = 0
+    for route, entry in sorted(stats.routes.items()):
+        requests = sum(entry["statuses"].values())
+        routes[route] = summary(entry["latencies"], entry["errors"], requests, duration)
+        routes[route]["statuses"] = {str(status): number for status, number in sorted(entry["statuses"].items(),
+                                                                                       key=str)}
+        routes[route]["queries"] = queries.get(route)
+        all_latencies.extend(entry["latencies"])
+        errors += entry["errors"]
+        count += requests
+
+    result = {
+        "commit": git_commit(),
+        "started": started.isoformat(timespec="seconds"),
+        "database": database,
+        "dataset": dataset.as_dict(),
+        "server": {"url": f"{host}:{port}", "workers": None if args.url else args.workers,
+                   "threads": None if args.url else args.threads},
+        "clients": args.clients,
+        "admin_clients": args.admin_clients,
+        "mix": parse_mix(args.mix),
+        "duration": round(duration, 1),
+        "total": summary(all_latencies, errors, count, duration),
+        "routes": routes,
+    }
+
+    print(f"{'адрес':<32} {'запросов':>8} {'ошибок':>7} {'в с':>7} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} "
+          f"{'SQL':>4}")
+    for route, r in list(routes.items()) + [("всего", dict(result["total"], queries=None))]:
+        print(f"{route:<32} {r['requests']:>8} {r['errors']:>7} {r['rps']:>7} {r['p50_ms']!s:>8} {r['p95_ms']!s:>8} "
+              f"{r['p99_ms']!s:>8} {r['queries'] if r['queries'] is not None else '':>4}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
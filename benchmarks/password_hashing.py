@@ -0,0 +1,93 @@
+# Пропускная способность входа в зависимости от стоимости хэша и размера пула.
+# python benchmarks/password_hashing.py --iterations 50000,150000,260000 --pool 0,1,2,4 --clients 8
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+import delive.passwords as passwords
+
+PASSWORD = "Benchmark1Password"
+
+
+# clients потоков (как процессы gunicorn) проверяют пароль logins раз в сумме
+def run(iterations, pool, clients, logins, queue_limit):
+    method = f"pbkdf2:sha256:{iterations}"
+    passwords.shutdown()
+    passwords.settings.update(method=method, workers=pool, queue_limit=queue_limit, timeout=300)
+    password_hash = generate_password_hash(PASSWORD, method)
+
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+
+    def client(count):
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                passwords.verify_password(password_hash, PASSWORD)
+            except passwords.PasswordPoolBusy:
+                with lock:
+                    rejected[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    # первый вызов запускает процессы пула и в замер не входит
+    passwords.verify_password(password_hash, PASSWORD)
+
+    threads = [threading.Thread(target=client, args=(logins // clients,)) for _ in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "pool": pool,
+        "clients": clients,
+        "logins": len(latencies),
+        "rejected": rejected[0],
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость входа в зависимости от параметров хэширования")
+    parser.add_argument("--iterations", default="50000,150000,260000", help="итерации PBKDF2 через запятую")
+    parser.add_argument("--pool", default="0,1,2,4", help="размеры пула через запятую (0 - без пула)")
+    parser.add_argument("--clients", type=int, default=8, help="одновременных клиентов")
+    parser.add_argument("--logins", type=int, default=64, help="всего входов в одном замере")
+    parser.add_argument("--queue-limit", type=int, default=64, help="длина очереди пула")
+    parser.add_argument("--json", help="файл для результатов в формате JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'итерации':>10} {'пул':>4} {'входов/с':>9} {'p50, мс':>8} {'p95, мс':>8} {'отказов':>8}")
+    for iterations in [int(value) for value in args.iterations.split(",")]:
+        for pool in [int(value) for value in args.pool.split(",")]:
+            result = run(iterations, pool, args.clients, args.logins, args.queue_limit)
+            results.append(result)
+            print(f"{iterations:>10} {pool:>4} {result['logins_per_second']:>9} {result['p50_ms']:>8} "
+                  f"{result['p95_ms']:>8} {result['rejected']:>8}")
+    passwords.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
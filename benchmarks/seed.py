@@ -0,0 +1,181 @@
+# Синтетические данные для нагрузочного теста: категории, блюда, пользователи, заказы.
+# python benchmarks/seed.py --dishes 100000 --orders 1000000 --users 50000 --reset
+# Без DATABASE_URL данные пишутся в SQLite benchmarks/bench.db. Пароль всех пользователей - PASSWORD,
+# адреса user<номер>@bench.test, администратор admin@bench.test.
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.dirname(os.path.abspath(__file__))}/bench.db"
+
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+
+from delive import app, db, catalog, passwords, popularity, sales, search
+from delive.models import Category, Dish, Order, User, dishes_orders
+
+PASSWORD = "Bench-password-1"
+ADMIN_EMAIL = "admin@bench.test"
+CHUNK_SIZE = 5000
+
+MONTHS = ["января", "фераля", "марта", "апреля", "мая", "июня", "июля", "августа", "сентября", "октября",
+          "ноября", "декабря"]
+KINDS = ["Ролл", "Пицца", "Салат", "Суп", "Бургер", "Паста", "Вок", "Сет", "Десерт", "Шаурма"]
+ADJECTIVES = ["острый", "сливочный", "домашний", "классический", "фирменный", "овощной", "копчёный", "летний"]
+INGREDIENTS = ["лосось", "угорь", "сыр", "курица", "говядина", "грибы", "томаты", "огурец", "авокадо", "рис",
+               "кунжут", "зелёный лук", "перец", "моцарелла", "пармезан", "креветки", "бекон", "соус терияки"]
+STREETS = ["ул. Ленина", "пр. Мира", "ул. Садовая", "ул. Лесная", "ул. Школьная", "наб. Речная"]
+# число блюд в заказе и его вероятность (в процентах)
+FAN_OUT = {1: 30, 2: 25, 3: 20, 4: 12, 5: 8, 6: 5}
+
+
+def created_text(value):
+    return f"{value.day} {MONTHS[value.month - 1]} {value.year} г."
+
+
+# Вставка строк порциями по CHUNK_SIZE
+def insert(table, rows, label):
+    started = time.perf_counter()
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            db.session.execute(table.insert(), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        count += len(chunk)
+    db.session.commit()
+    print(f"{label}: {count} строк за {time.perf_counter() - started:.1f} с")
+    return count
+
+
+# После вставки с явными id последовательности PostgreSQL продолжаются с максимального id
+def reset_sequences(tables):
+    if db.engine.dialect.name != "postgresql":
+        return
+    for table in tables:
+        db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                f"(SELECT coalesce(max(id), 1) FROM {table}))"))
+    db.session.commit()
+
+
+def categories(count):
+    for i in range(1, count + 1):
+        yield {"id": i, "title": f"Категория {i}"}
+
+
+def dishes(rng, count, category_count, pictures):
+    for i in range(1, count + 1):
+        kind = KINDS[i % len(KINDS)]
+        yield {"id": i, "title": f"{kind} {rng.choice(ADJECTIVES)} №{i}", "price": rng.randrange(150, 900, 10),
+               "description": ", ".join(rng.sample(INGREDIENTS, rng.randint(3, 5))).capitalize(),
+               "picture": pictures[i % len(pictures)], "category_id": 1 + i % category_count}
+
+
+def users(count):
+    password_hash = generate_password_hash(PASSWORD, passwords.settings["method"], passwords.settings["salt_length"])
+    yield {"id": 1, "email": ADMIN_EMAIL, "password_hash": password_hash, "role": 0}
+    for i in range(2, count + 1):
+        yield {"id": i, "email": f"user{i}@bench.test", "password_hash": password_hash, "role": 1}
+
+
+# Заказы и их блюда. Популярность блюд убывает по закону Ципфа, даты - за последние days дней
+def orders(rng, count, user_count, prices, days, links):
+    dish_ids = list(prices)
+    rng.shuffle(dish_ids)
+    cum_weights = []
+    total = 0.0
+    for rank in range(len(dish_ids)):
+        total += 1 / (rank + 1) ** 1.1
+        cum_weights.append(total)
+
+    sizes, size_weights = list(FAN_OUT), list(FAN_OUT.values())
+    now = datetime.utcnow()
+    for i in range(1, count + 1):
+        created_at = now - timedelta(seconds=rng.randrange(days * 86400))
+        ordered = set(rng.choices(dish_ids, cum_weights=cum_weights, k=rng.choices(sizes, size_weights)[0]))
+        links.extend({"order_id": i, "dish_id": dish_id} for dish_id in ordered)
+        user_id = rng.randint(1, user_count)
+        yield {"id": i, "created": created_text(created_at), "created_at": created_at, "name": "Покупатель",
+               "total": sum(prices[dish_id] for dish_id in ordered),
+               "status": 3 if now - created_at > timedelta(hours=3) else rng.randint(0, 3),
+               "phone": f"+7999{i % 10000000:07d}", "email": f"user{user_id}@bench.test",
+               "delivery_address": f"{rng.choice(STREETS)}, д. {rng.randint(1, 120)}", "user_id": user_id}
+
+
+# Заказы вставляются вместе со ссылками на блюда порциями, чтобы не держать в памяти все ссылки
+def insert_orders(rng, args, prices):
+    started = time.perf_counter()
+    links = []
+    chunk = []
+    count = 0
+    link_count = 0
+    for row in orders(rng, args.orders, args.users, prices, args.days, links):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            db.session.execute(Order.__table__.insert(), chunk)
+            db.session.execute(dishes_orders.insert(), links)
+            count += len(chunk)
+            link_count += len(links)
+            chunk = []
+            links.clear()
+            if count % (CHUNK_SIZE * 20) == 0:
+                db.session.commit()
+                print(f"  заказов: {count}")
+    if chunk:
+        db.session.execute(Order.__table__.insert(), chunk)
+        db.session.execute(dishes_orders.insert(), links)
+        count += len(chunk)
+        link_count += len(links)
+    db.session.commit()
+    print(f"Заказы: {count} строк, блюд в заказах: {link_count} за {time.perf_counter() - started:.1f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические данные для нагрузочного теста")
+    parser.add_argument("--categories", type=int, default=12, help="категорий")
+    parser.add_argument("--dishes", type=int, default=100000, help="блюд")
+    parser.add_argument("--users", type=int, default=50000, help="пользователей (первый - администратор)")
+    parser.add_argument("--orders", type=int, default=1000000, help="заказов")
+    parser.add_argument("--days", type=int, default=90, help="за сколько последних дней созданы заказы")
+    parser.add_argument("--seed", type=int, default=1, help="начальное значение генератора случайных чисел")
+    parser.add_argument("--reset", action="store_true", help="удалить все таблицы перед загрузкой")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pictures = sorted(name for name in os.listdir(os.path.join(app.static_folder, "pictures"))
+                      if os.path.isfile(os.path.join(app.static_folder, "pictures", name)))
+
+    with app.app_context():
+        print(f"БД: {db.engine.url!r}")
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if db.session.query(Dish.id).first() is not None or db.session.query(User.id).first() is not None:
+            sys.exit("В БД уже есть данные: запустите с --reset")
+        search.create_index(db.engine)
+
+        insert(Category.__table__, categories(args.categories), "Категории")
+        insert(Dish.__table__, dishes(rng, args.dishes, args.categories, pictures), "Блюда")
+        insert(User.__table__, users(args.users), "Пользователи")
+        prices = dict(db.session.query(Dish.id, Dish.price))
+        insert_orders(rng, args, prices)
+        reset_sequences(["categories", "dishes", "users", "orders"])
+
+        started = time.perf_counter()
+        sales.rebuild()
+        popularity.rebuild()
+        catalog.bump_version()
+        print(f"Сводка продаж и популярность блюд: {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,19 @@ from flask import Flask
 
 from delive.config import Config
 from delive.models import db, migrate
+import delive.compression as compression
+import delive.profiling as profiling
+import delive.sessions as sessions
+import delive.importer as importer
+import delive.passwords as passwords
+import delive.images as images
+import delive.assets as assets
+import delive.fragments as fragments
+import delive.api as api
+import delive.events as events
+import delive.sales as sales
+import delive.popularity as popularity
+import delive.metrics as metrics
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -13,6 +26,24 @@ app.config.update(
 
 db.init_app(app)
 migrate.init_app(app, db, f'{config.current_path}/migrations')
+# сжатие ответов подключается первым, чтобы выполняться после всех остальных after_request
+compression.init_app(app)
+# метрики - сразу после сжатия: время ответа считается от первого before_request
+# до последнего after_request перед сжатием
+metrics.init_app(app)
+# замеры запросов охватывают весь запрос, включая загрузку и сохранение сессии
+profiling.init_app(app)
+sessions.init_app(app)
+importer.init_app(app)
+passwords.init_app(app)
+images.init_app(app)
+assets.init_app(app)
+fragments.init_app(app)
+api.init_app(app)
+events.init_app(app)
+sales.init_app(app)
+popularity.init_app(app)
 
 from delive.views import *
+import delive.export
 from delive.admin import *
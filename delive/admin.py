@@ -1,18 +1,26 @@
-from flask_admin import Admin
+from flask import flash, g
+from flask_admin import Admin, BaseView, expose
+from flask_admin.actions import action
 from flask_admin.contrib.sqla import ModelView
 from flask_admin.menu import MenuLink
 from wtforms.validators import DataRequired, Email, Length
 from flask_admin.form import SecureForm
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import joinedload, raiseload
 
-from delive import User, Order, Dish, app, db, Category, session, abort
+from delive import User, Order, app, db, session, abort, request
+from delive.models import Dish, Category
+import delive.catalog as catalog
+import delive.orders as orders
+from delive.api import json_response, error_response
+import delive.images as images
+import delive.events as events
+import delive.sales as sales
+import delive.search as search
 
 
-class MyModelView(ModelView):
-    page_size = 50  # the number of entries to display on the list view
-    can_view_details = True
-    can_export = True
-    form_base_class = SecureForm
-    
+# Доступ к разделам и ссылкам админки только для администратора
+class AdminAccessMixin:
     def is_accessible(self):
         if session.get("user", None):
             user = session["user"]
@@ -27,22 +35,120 @@ class MyModelView(ModelView):
         abort(403, description="Вам сюда нельзя")
 
 
-class MyMenuLink(MenuLink):
-    def is_accessible(self):
-        if session.get("user", None):
-            user = session["user"]
-            if user["role"] == 0:
-                return True
-        return False
+class MyModelView(AdminAccessMixin, ModelView):
+    page_size = 50  # the number of entries to display on the list view
+    can_view_details = True
+    can_export = True
+    form_base_class = SecureForm
     
-    def is_visible(self):
-        return self.is_accessible()
+    # Параметры загрузки связей для строк списка, например (joinedload(Order.user),)
+    list_load_options = ()
+    # Листание по первичному ключу (WHERE id < последний id предыдущей страницы) вместо OFFSET.
+    # Используется для соседних страниц при сортировке по умолчанию, которая должна быть по первичному ключу;
+    # шаблон admin/keyset_list.html оставляет в пейджере только соседние страницы.
+    keyset_paging = False
     
-    def inaccessible_callback(self, name, **kwargs):
-        abort(403, description="Вам сюда нельзя")
+    # Приблизительное число строк таблицы из статистики PostgreSQL,
+    # если оно не меньше ADMIN_COUNT_ESTIMATE_THRESHOLD (иначе None - нужен точный COUNT(*))
+    def estimate_count(self):
+        threshold = app.config["ADMIN_COUNT_ESTIMATE_THRESHOLD"]
+        if not threshold or db.engine.dialect.name != "postgresql":
+            return None
+        estimate = self.session.execute(text("SELECT reltuples FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                                        {"table": self.model.__table__.name}).scalar()
+        return int(estimate) if estimate is not None and estimate >= threshold else None
+    
+    # Курсор страницы ("after" или "before", id), если листание по ключу применимо
+    def _keyset_cursor(self, page, sort_column):
+        if not self.keyset_paging or sort_column is not None or not page:
+            return None
+        for direction in ("after", "before"):
+            value = request.args.get(direction, type=int)
+            if value is not None:
+                return direction, value
+        return None
+    
+    def _apply_keyset(self, query, cursor, page_size):
+        pk = getattr(self.model, self._primary_key)
+        desc = self._get_default_order_desc()
+        direction, value = cursor
+        if direction == "after":
+            query = query.filter(pk < value if desc else pk > value)
+        else:
+            # предыдущая страница выбирается в обратном порядке и переворачивается после выполнения
+            query = query.filter(pk > value if desc else pk < value) \
+                .order_by(None).order_by(pk.asc() if desc else pk.desc())
+        return query.limit(page_size or self.page_size)
+    
+    def _get_default_order_desc(self):
+        order = self.column_default_sort
+        return isinstance(order, tuple) and order[1]
+    
+    # Как ModelView.get_list, но с list_load_options, приблизительным числом строк без поиска
+    # и фильтров и листанием по ключу. Границы страницы запоминаются для ссылок пейджера.
+    # Основа скопирована из flask_admin.contrib.sqla.ModelView.get_list версии 1.5.7 (requirements.txt):
+    # при обновлении Flask-Admin сверить с новой версией.
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        joins = {}
+        count_joins = {}
+        
+        query = self.get_query().options(*self.list_load_options)
+        count_query = self.get_count_query() if not self.simple_list_pager else None
+        
+        if self._search_supported and search:
+            query, count_query, joins, count_joins = self._apply_search(query, count_query, joins, count_joins,
+                                                                        search)
+        if filters and self._filters:
+            query, count_query, joins, count_joins = self._apply_filters(query, count_query, joins, count_joins,
+                                                                         filters)
+        
+        count = None
+        if count_query is not None:
+            if not search and not filters:
+                count = self.estimate_count()
+            if count is None:
+                count = count_query.scalar()
+        
+        for j in self._auto_joins:
+            query = query.options(joinedload(j))
+        
+        query, joins = self._apply_sorting(query, joins, sort_column, sort_desc)
+        
+        cursor = self._keyset_cursor(page, sort_column)
+        if cursor:
+            query = self._apply_keyset(query, cursor, page_size)
+        else:
+            query = self._apply_pagination(query, page, page_size)
+        
+        if execute:
+            query = query.all()
+            if cursor and cursor[0] == "before":
+                query.reverse()
+            if self.keyset_paging and sort_column is None and query:
+                g.admin_page_bounds = (page or 0, self.get_pk_value(query[0]), self.get_pk_value(query[-1]))
+        
+        return count, query
+    
+    # Ссылки на соседние страницы получают курсор, остальные ссылки списка - нет
+    def _get_list_url(self, view_args):
+        extra_args = {key: value for key, value in view_args.extra_args.items() if key not in ("after", "before")}
+        bounds = g.get("admin_page_bounds")
+        if bounds and view_args.sort is None and view_args.page:
+            page, first, last = bounds
+            if view_args.page == page + 1:
+                extra_args["after"] = last
+            elif view_args.page == page - 1:
+                extra_args["before"] = first
+        return super()._get_list_url(view_args.clone(extra_args=extra_args))
+
+
+class MyMenuLink(AdminAccessMixin, MenuLink):
+    pass
 
 
 class UserModelView(MyModelView):
+    # большие таблицы выгружаются потоково через /export/
+    can_export = False
     column_exclude_list = ['password_hash', ]
     form_excluded_columns = ['password_hash', ]
     column_searchable_list = ['role']
@@ -70,10 +176,19 @@ class UserModelView(MyModelView):
 
 
 class OrderModelView(MyModelView):
+    # большие таблицы выгружаются потоково через /export/
+    can_export = False
+    # новые заказы сверху; соседние страницы выбираются по id
+    column_default_sort = ('id', True)
+    keyset_paging = True
+    list_template = 'admin/keyset_list.html'
+    # в списке нет колонок со связями: построчная подгрузка пользователя и блюд считается ошибкой
+    list_load_options = (raiseload(Order.user), raiseload(Order.dishes))
     column_exclude_list = ['delivery_address', 'user']
-    column_filters = ['name', 'status']
+    column_filters = ['name', 'status', 'created_at']
     column_editable_list = ['status', 'phone']
-    column_labels = dict(name='Имя', total='Сумма', created='Создан', status='Статус', phone='Телефон',
+    column_labels = dict(name='Имя', total='Сумма', created='Создан', created_at='Время (UTC)', status='Статус',
+                         phone='Телефон',
                          delivery_adress='Адрес', user='Пользователь', dishes='Блюда')
     form_choices = {
         'status': [
@@ -134,9 +249,83 @@ class OrderModelView(MyModelView):
         },
         
     }
+    
+    # Изменение статуса (в форме или в списке) сохраняется событием в той же транзакции,
+    # покупатель получает его через /account/events/.
+    # Сводка продаж (daily_sales) обновляется в той же транзакции
+    def on_model_change(self, form, model, is_created):
+        if is_created:
+            sales.record_order(model)
+            return
+        
+        status_changed = inspect(model).attrs.status.history.has_changes()
+        sales.record_change(model)
+        if status_changed:
+            events.publish(model)
+    
+    def on_model_delete(self, model):
+        sales.record_delete(model)
+    
+    # Групповой перевод заказов в следующий статус. Заказы, которые уже в другом статусе, пропускаются
+    def _advance_selected(self, ids, status):
+        try:
+            changed = orders.advance_status([int(order_id) for order_id in ids], status - 1, status)
+            db.session.commit()
+        except ValueError as ex:
+            db.session.rollback()
+            flash(f"Не удалось изменить статус: {ex}", "error")
+            return
+        flash(f"Статус изменён у {len(changed)} из {len(ids)} заказов", "success" if changed else "warning")
+    
+    @action('prepare', 'Готовится', 'Перевести принятые заказы в статус "готовится"?')
+    def action_prepare(self, ids):
+        self._advance_selected(ids, 1)
+    
+    @action('ship', 'Доставляется', 'Перевести готовящиеся заказы в статус "доставляется"?')
+    def action_ship(self, ids):
+        self._advance_selected(ids, 2)
+    
+    @action('deliver', 'Доставлен', 'Перевести доставляемые заказы в статус "доставлен"?')
+    def action_deliver(self, ids):
+        self._advance_selected(ids, 3)
+    
+    # JSON для кухни: {"ids": [...], "status": 2, "expected": 1} (expected по умолчанию status - 1).
+    # Принимается только application/json, поэтому обычная форма с чужого сайта сюда не отправится.
+    @expose('/status/', methods=('POST',))
+    def status_view(self):
+        data = request.get_json(silent=True) if request.is_json else None
+        if not isinstance(data, dict):
+            return error_response("Ожидается JSON-объект", 400)
+        try:
+            ids = [int(order_id) for order_id in data.get("ids", [])]
+            status = int(data["status"])
+            expected = int(data.get("expected", status - 1))
+        except (KeyError, TypeError, ValueError):
+            return error_response("Нужны ids (список id заказов) и status", 400)
+        
+        try:
+            changed = orders.advance_status(ids, expected, status)
+        except ValueError as ex:
+            return error_response(str(ex), 400)
+        db.session.commit()
+        
+        skipped = sorted(set(ids) - set(changed))
+        return json_response({"status": status, "expected": expected, "updated": len(changed),
+                              "ids": changed, "skipped": skipped})
+
 
+# Представления каталога: любое изменение увеличивает версию каталога
+class CatalogModelView(MyModelView):
+    def after_model_change(self, form, model, is_created):
+        catalog.bump_version()
+    
+    def after_model_delete(self, model):
+        catalog.bump_version()
 
-class DishModelView(MyModelView):
+
+class DishModelView(CatalogModelView):
+    # большие таблицы выгружаются потоково через /export/
+    can_export = False
     column_exclude_list = ['picture', 'description']
     column_searchable_list = ['title']
     column_filters = ['category']
@@ -173,9 +362,23 @@ class DishModelView(MyModelView):
             'rows': 10,
         }
     }
+    
+    # уменьшенные копии нового или изменённого изображения создаются сразу
+    def after_model_change(self, form, model, is_created):
+        super().after_model_change(form, model, is_created)
+        images.build_all(model.picture)
+    
+    # Поиск по полнотекстовому индексу (название и описание) вместо LIKE по названию
+    def _apply_search(self, query, count_query, joins, count_joins, search_query):
+        clause = search.matching_clause(search_query)
+        if clause is not None:
+            query = query.filter(clause)
+            if count_query is not None:
+                count_query = count_query.filter(clause)
+        return query, count_query, joins, count_joins
 
 
-class CategoryModelView(MyModelView):
+class CategoryModelView(CatalogModelView):
     column_editable_list = ['title']
     column_labels = dict(title='Название', dishes='Блюда')
     
@@ -190,16 +393,31 @@ class CategoryModelView(MyModelView):
     }
 
 
+# Сводка продаж: читается только таблица daily_sales
+class SalesView(AdminAccessMixin, BaseView):
+    @expose('/')
+    def index(self):
+        days = request.args.get("days", 30, type=int)
+        by_day, by_status = sales.report(days)
+        return self.render("admin/sales.html", days=days, by_day=by_day, by_status=by_status)
+
+
 admin = Admin(app, "Панель управления", "/sadmin/")
 
 admin.add_view(UserModelView(User, db.session, "Пользователи", "Магазин"))
 admin.add_view(OrderModelView(Order, db.session, "Заказы", "Магазин"))
 admin.add_view(DishModelView(Dish, db.session, "Товары", "Магазин"))
 admin.add_view(CategoryModelView(Category, db.session, "Категории", "Магазин"))
+admin.add_view(SalesView("Продажи", "Отчёты", endpoint="sales"))
 
 admin.add_menu_item(MyMenuLink("Перейти на сайт", "/"), "Управление")
 admin.add_menu_item(MyMenuLink("Войти в аккаунт", "/account/"), "Управление")
 admin.add_menu_item(MyMenuLink("Вход/выход", "/logout"), "Управление")
 
+admin.add_menu_item(MyMenuLink("Заказы (CSV)", "/export/orders/"), "Экспорт")
+admin.add_menu_item(MyMenuLink("Заказы (JSONL)", "/export/orders/?format=jsonl"), "Экспорт")
+admin.add_menu_item(MyMenuLink("Товары (CSV)", "/export/dishes/"), "Экспорт")
+admin.add_menu_item(MyMenuLink("Пользователи (CSV)", "/export/users/"), "Экспорт")
+
 admin.add_menu_item(MyMenuLink("Создать/обновить БД", "/upgradedb/gdrgr/"), "База данных")
 admin.add_menu_item(MyMenuLink("Загрузить данные в чистую БД", "/loaddb/"), "База данных")
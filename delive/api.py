@@ -0,0 +1,161 @@
+import json
+from functools import wraps
+
+from flask import Blueprint, current_app, request, session, url_for
+
+import delive.catalog as catalog
+import delive.cart as carts
+import delive.conditional as conditional
+import delive.orders as orders
+import delive.search as search
+from delive.fragments import LRUCache
+from delive.routing import read_only
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# Готовые JSON страниц каталога: (версия каталога, параметры страницы) -> тело ответа
+_pages = LRUCache(maxsize=128, ttl=300, name="api_pages")
+
+
+# Компактный JSON без пробелов и без экранирования кириллицы
+def json_response(data, status=200):
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return current_app.response_class(body, status=status, mimetype="application/json")
+
+
+def error_response(message, status):
+    return json_response({"error": message}, status)
+
+
+# Авторизация как у login_required, но вместо перенаправления на вход - ответ 401
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not session.get('user'):
+            return error_response("Требуется вход", 401)
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def dish_dict(dish):
+    return {"id": dish.id, "title": dish.title, "price": dish.price, "description": dish.description,
+            "category_id": dish.category_id,
+            "picture": url_for("static", filename="pictures/" + dish.picture) if dish.picture else None}
+
+
+def cart_dict(priced):
+    return {"dishes": [{"id": dish.id, "title": dish.title, "price": dish.price} for dish in priced.dishes],
+            "count": len(priced.dishes), "total": priced.total}
+
+
+def order_dict(order):
+    return {"id": order.id, "created": order.created,
+            "created_at": order.created_at.isoformat() if order.created_at else None,
+            "status": order.status, "total": order.total,
+            "dishes": [{"id": dish.id, "title": dish.title, "price": dish.price} for dish in order.dishes]}
+
+
+# Категории каталога
+@api.route("/categories/")
+@read_only
+@conditional.public_catalog_conditional
+def categories():
+    snapshot = catalog.get_snapshot()
+    key = (snapshot.version, "categories")
+    body = _pages.get(key)
+    if body is None:
+        body = json_response({"categories": [category._asdict() for category in snapshot.categories]}).get_data()
+        _pages.set(key, body)
+    return current_app.response_class(body, mimetype="application/json")
+
+
+# Блюда каталога постранично: ?category=<id>&page=<номер>&per_page=<количество>.
+# Данные берутся из снимка каталога, готовый JSON страницы кэшируется до смены версии каталога.
+@api.route("/dishes/")
+@read_only
+@conditional.public_catalog_conditional
+def dishes():
+    snapshot = catalog.get_snapshot()
+    category_id = request.args.get("category", type=int)
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", current_app.config["API_PAGE_SIZE"], type=int), 1),
+                   current_app.config["API_MAX_PAGE_SIZE"])
+
+    key = (snapshot.version, category_id, page, per_page)
+    body = _pages.get(key)
+    if body is None:
+        items, total = catalog.dish_page(snapshot, category_id, (page - 1) * per_page, per_page)
+        body = json_response({"dishes": [dish_dict(dish) for dish in items],
+                              "page": page, "per_page": per_page, "total": total}).get_data()
+        _pages.set(key, body)
+    return current_app.response_class(body, mimetype="application/json")
+
+
+# Поиск блюд: ?q=<запрос>&page=<номер>&per_page=<количество>
+@api.route("/search/")
+@read_only
+def search_dishes():
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", current_app.config["API_PAGE_SIZE"], type=int), 1),
+                   current_app.config["API_MAX_PAGE_SIZE"])
+    dish_ids, total = search.search(request.args.get("q", ""), page, per_page)
+    found = catalog.find_dishes(catalog.get_snapshot(), dish_ids)
+    return json_response({"dishes": [dish_dict(dish) for dish in found],
+                          "page": page, "per_page": per_page, "total": total})
+
+
+# Подсказки для строки поиска: ?q=<начало запроса>
+@api.route("/suggest/")
+@read_only
+def suggest():
+    rows = search.suggest(request.args.get("q", ""))
+    response = json_response({"suggestions": [{"id": row.id, "title": row.title} for row in rows]})
+    # подсказки для одного и того же ввода повторяются, их можно недолго кэшировать
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return response
+
+
+# Содержимое корзины текущей сессии
+@api.route("/cart/")
+@read_only
+def show_cart():
+    priced = carts.price_cart(session.get("cart", []))
+    carts.store(priced)
+    return json_response(cart_dict(priced))
+
+
+# Добавление блюда в корзину, в ответе - корзина с новой суммой
+@api.route("/cart/<int:dish_id>/", methods=["POST", "PUT"])
+def add_to_cart(dish_id):
+    cart = session.get("cart", [])
+    if dish_id in cart:
+        return error_response("Вы не можете добавлять в корзину два и более одинаковых товара", 409)
+
+    priced = carts.price_cart(cart + [dish_id])
+    if dish_id not in (dish.id for dish in priced.dishes):
+        return error_response("К сожалению, данного товара в нашей базе данных нет", 404)
+
+    carts.store(priced)
+    return json_response(cart_dict(priced), 201)
+
+
+# Удаление блюда из корзины
+@api.route("/cart/<int:dish_id>/", methods=["DELETE"])
+def remove_from_cart(dish_id):
+    priced = carts.without(carts.price_cart(session.get("cart", [])), dish_id)
+    carts.store(priced)
+    return json_response(cart_dict(priced))
+
+
+# История заказов пользователя: ?before=<id> - следующая страница
+@api.route("/orders/")
+@api_login_required
+def order_history():
+    user_orders, next_before = orders.order_history(session["user"]["id"], request.args.get("before", type=int),
+                                                    current_app.config["ACCOUNT_ORDERS_PAGE_SIZE"])
+    return json_response({"orders": [order_dict(order) for order in user_orders], "next_before": next_before})
+
+
+def init_app(app):
+    app.register_blueprint(api)
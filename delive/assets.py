@@ -0,0 +1,116 @@
+import hashlib
+import json
+import mimetypes
+import os
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup, with_appcontext
+
+import delive.compression as compression
+
+# Служебные файлы и каталоги, которые не переименовываются
+MANIFEST_NAME = "manifest.json"
+SKIP_DIRS = ("pictures/derived",)
+SKIP_SUFFIXES = (".gz", ".br", ".tmp")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class Manifest:
+    def __init__(self, files=None):
+        # исходное имя -> (имя с хэшем, полный хэш содержимого)
+        self.files = files or {}
+        self.originals = {hashed: name for name, (hashed, digest) in self.files.items()}
+
+
+# Имя файла с хэшем содержимого: css/styles.css -> css/styles.3f2a9c0d1e.css
+def hashed_name(name, digest):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest[:10]}{ext}"
+
+
+# Хэширование всех файлов каталога static
+def build_manifest(static_folder):
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        rel_dir = os.path.relpath(dirpath, static_folder).replace(os.sep, "/")
+        prefix = "" if rel_dir == "." else f"{rel_dir}/"
+        dirnames[:] = [d for d in dirnames if prefix + d not in SKIP_DIRS]
+        for filename in filenames:
+            name = prefix + filename
+            if name == MANIFEST_NAME or name.endswith(SKIP_SUFFIXES):
+                continue
+            with open(os.path.join(dirpath, filename), "rb") as f:
+                digest = hashlib.md5(f.read()).hexdigest()
+            files[name] = (hashed_name(name, digest), digest)
+    return Manifest(files)
+
+
+# Манифест из static/manifest.json (создаётся командой flask assets build), иначе - хэширование при запуске
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, MANIFEST_NAME)
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            return Manifest({name: tuple(value) for name, value in json.load(f).items()})
+    return build_manifest(static_folder)
+
+
+# Подстановка имени с хэшем в url_for('static', filename=...)
+def hashed_url_defaults(endpoint, values):
+    if endpoint == "static" and "filename" in values:
+        entry = current_app.extensions["assets"].files.get(values["filename"])
+        if entry:
+            values["filename"] = entry[0]
+
+
+# Отдача статических файлов: адреса с хэшем кэшируются навсегда,
+# у остальных - строгий ETag по содержимому и проверка при каждом обращении
+def serve_static(filename):
+    manifest = current_app.extensions["assets"]
+    original = manifest.originals.get(filename)
+    name = original or filename
+    entry = manifest.files.get(name)
+
+    # заранее сжатая копия (flask assets compress), если она есть и клиент её принимает
+    path, encoding = compression.precompressed(current_app.static_folder, name)
+    response = send_from_directory(current_app.static_folder, path, add_etags=False, conditional=False)
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        response.headers["Content-Encoding"] = encoding
+    if entry:
+        response.set_etag(f"{entry[1]}-{encoding}" if encoding else entry[1])
+    if original:
+        response.headers["Cache-Control"] = IMMUTABLE
+    else:
+        response.headers["Cache-Control"] = "public, no-cache"
+    return response.make_conditional(request)
+
+
+assets_cli = AppGroup("assets", help="Статические файлы")
+
+
+@assets_cli.command("build")
+@with_appcontext
+def build_command():
+    """Создание static/manifest.json с хэшами статических файлов"""
+    manifest = build_manifest(current_app.static_folder)
+    with open(os.path.join(current_app.static_folder, MANIFEST_NAME), "w") as f:
+        json.dump(manifest.files, f, indent=1, sort_keys=True)
+    click.echo(f"Файлов в манифесте: {len(manifest.files)}")
+
+
+@assets_cli.command("compress")
+@with_appcontext
+def compress_command():
+    """Создание сжатых копий (.gz, .br) текстовых статических файлов"""
+    count = compression.compress_static(current_app.static_folder)
+    click.echo(f"Сжато файлов: {count}" + ("" if compression.brotli else " (только gzip: пакет brotli не установлен)"))
+
+
+def init_app(app):
+    app.cli.add_command(assets_cli)
+    if app.config["ASSETS_FINGERPRINT"]:
+        app.extensions["assets"] = load_manifest(app.static_folder)
+        app.url_defaults(hashed_url_defaults)
+        app.view_functions["static"] = serve_static
@@ -0,0 +1,41 @@
+from collections import namedtuple
+
+from flask import session
+
+from delive.models import db, Dish
+
+# Содержимое корзины: блюда в порядке добавления и сумма по ценам из БД
+PricedCart = namedtuple("PricedCart", ["dishes", "total"])
+
+
+# Загрузка всех блюд корзины одним запросом IN (...).
+# Отсутствующие в БД блюда отбрасываются, сумма пересчитывается по текущим ценам.
+def price_cart(dish_ids):
+    ids = list(dict.fromkeys(dish_ids))
+    if not ids:
+        return PricedCart([], 0)
+
+    found = {dish.id: dish for dish in db.session.query(Dish).filter(Dish.id.in_(ids))}
+    dishes = [found[dish_id] for dish_id in ids if dish_id in found]
+    return PricedCart(dishes, sum(dish.price or 0 for dish in dishes))
+
+
+# Корзина без указанного блюда
+def without(priced, dish_id):
+    dishes = [dish for dish in priced.dishes if dish.id != dish_id]
+    return PricedCart(dishes, sum(dish.price or 0 for dish in dishes))
+
+
+# Запись корзины в сессию. Неизменившиеся значения не записываются: иначе сессия
+# помечается изменённой и сохраняется в хранилище при каждом просмотре корзины
+def store(priced):
+    values = {"cart": [dish.id for dish in priced.dishes], "total": priced.total, "count": len(priced.dishes)}
+    defaults = {"cart": [], "total": 0, "count": 0}
+    for key, value in values.items():
+        if session.get(key, defaults[key]) != value:
+            session[key] = value
+
+
+# Очистка корзины
+def clear():
+    store(PricedCart([], 0))
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from delive.models import db, Category, Dish, CatalogVersion
+
+# Неизменяемые копии записей каталога, которые хранятся в памяти процесса
+CategoryItem = namedtuple("CategoryItem", ["id", "title"])
+DishItem = namedtuple("DishItem", ["id", "title", "price", "description", "picture", "category_id"])
+Snapshot = namedtuple("Snapshot", ["version", "updated", "categories", "dishes", "by_category", "by_id"])
+DISH_COLUMNS = (Dish.id, Dish.title, Dish.price, Dish.description, Dish.picture, Dish.category_id)
+
+_lock = threading.Lock()
+# генератор случайных чисел создаётся один раз на процесс
+_rng = random.Random()
+_snapshot = None
+_checked = 0.0
+
+
+# Текущая версия каталога и время её изменения из БД (None, если таблицы версий ещё нет)
+def read_version():
+    try:
+        row = db.session.query(CatalogVersion.version, CatalogVersion.updated).filter_by(id=1).first()
+    except (OperationalError, ProgrammingError):
+        db.session.rollback()
+        return None, None
+    return (row.version, row.updated) if row else (0, None)
+
+
+# Увеличение версии каталога после изменения блюд или категорий.
+# Остальные процессы увидят новую версию при очередной проверке.
+def bump_version():
+    global _checked
+
+    changed = db.session.query(CatalogVersion).filter_by(id=1).update(
+        {CatalogVersion.version: CatalogVersion.version + 1, CatalogVersion.updated: datetime.utcnow()},
+        synchronize_session=False)
+    if not changed:
+        db.session.add(CatalogVersion(id=1, version=1, updated=datetime.utcnow()))
+    db.session.commit()
+
+    # в текущем процессе снимок перестраивается сразу
+    _checked = 0.0
+
+
+# Группировка блюд по категориям: category_id -> кортеж блюд
+def group_by_category(dishes):
+    groups = {}
+    for dish in dishes:
+        groups.setdefault(dish.category_id, []).append(dish)
+    return {category_id: tuple(items) for category_id, items in groups.items()}
+
+
+# Блюда хранятся в снимке, если случайная выборка для главной не делается в БД
+# (CATALOG_SAMPLE_IN_DB - для больших каталогов; тогда в снимке только категории)
+def dishes_in_memory():
+    return not current_app.config.get("CATALOG_SAMPLE_IN_DB", False)
+
+
+def _build(version, updated):
+    categories = tuple(CategoryItem(c.id, c.title) for c in db.session.query(Category).order_by(Category.id))
+    dishes = ()
+    if dishes_in_memory():
+        dishes = tuple(DishItem(*row) for row in db.session.query(*DISH_COLUMNS).order_by(Dish.id))
+    return Snapshot(version, updated, categories, dishes, group_by_category(dishes),
+                    {dish.id: dish for dish in dishes})
+
+
+# Снимок каталога. Версия в БД сверяется не чаще, чем раз в
+# CATALOG_VERSION_CHECK_INTERVAL секунд, в остальное время запросов к БД нет.
+def get_snapshot():
+    global _snapshot, _checked
+
+    interval = current_app.config.get("CATALOG_VERSION_CHECK_INTERVAL", 5)
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _checked < interval:
+        return snapshot
+
+    with _lock:
+        if _snapshot is not None and time.monotonic() - _checked < interval:
+            return _snapshot
+
+        version, updated = read_version()
+        if _snapshot is None or version is None or version != _snapshot.version:
+            _snapshot = _build(version, updated)
+        _checked = time.monotonic()
+        return _snapshot
+
+
+# Случайная выборка items_count элементов
+def sample(items, items_count):
+    if items and len(items) > items_count:
+        return _rng.sample(items, items_count)
+    return items
+
+
+# Случайные items_count блюд каждой категории, отобранные в БД оконной функцией,
+# чтобы при большом каталоге не загружать всю таблицу блюд
+def sample_from_db(items_count):
+    rank = func.row_number().over(partition_by=Dish.category_id, order_by=func.random()).label("rank")
+    ranked = db.session.query(*DISH_COLUMNS, rank).subquery()
+    rows = db.session.query(ranked.c.id, ranked.c.title, ranked.c.price, ranked.c.description,
+                            ranked.c.picture, ranked.c.category_id).filter(ranked.c.rank <= items_count)
+    return group_by_category(DishItem(*row) for row in rows)
+
+
+# Блюда для рядов категорий на главной: функция вызывается из шаблона внутри блока кэша фрагмента,
+# поэтому выборка выполняется только при промахе кэша. В БД - один запрос сразу на все категории.
+def row_sampler(snapshot, items_count):
+    sampled = None
+
+    def row_dishes(category_id):
+        nonlocal sampled
+        if dishes_in_memory():
+            return sample(snapshot.by_category.get(category_id, ()), items_count)
+        if sampled is None:
+            sampled = sample_from_db(items_count)
+        return sampled.get(category_id, ())
+
+    return row_dishes
+
+
+# Блюда с указанными id в том же порядке: из снимка или, если блюд в нём нет, одним запросом IN (...)
+def find_dishes(snapshot, ids):
+    if dishes_in_memory():
+        return [snapshot.by_id[dish_id] for dish_id in ids if dish_id in snapshot.by_id]
+    if not ids:
+        return []
+    found = {row.id: DishItem(*row) for row in db.session.query(*DISH_COLUMNS).filter(Dish.id.in_(ids))}
+    return [found[dish_id] for dish_id in ids if dish_id in found]
+
+
+# Страница блюд категории (или всего каталога, category_id=None): (блюда, всего блюд)
+def dish_page(snapshot, category_id, start, count):
+    if dishes_in_memory():
+        items = snapshot.dishes if category_id is None else snapshot.by_category.get(category_id, ())
+        return items[start:start + count], len(items)
+    query = db.session.query(*DISH_COLUMNS)
+    if category_id is not None:
+        query = query.filter(Dish.category_id == category_id)
+    return [DishItem(*row) for row in query.order_by(Dish.id).offset(start).limit(count)], query.count()
@@ -0,0 +1,95 @@
+import gzip
+import os
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Типы содержимого, которые имеет смысл сжимать (изображения уже сжаты)
+COMPRESSIBLE = ("text/html", "text/css", "text/plain", "text/csv", "text/javascript", "application/javascript",
+                "application/json", "application/x-ndjson", "image/svg+xml")
+# Расширения статических файлов, для которых заранее создаются .gz и .br
+STATIC_EXTENSIONS = (".css", ".js", ".svg", ".html", ".json", ".txt")
+
+
+# Лучший из поддерживаемых клиентом способов сжатия (br, затем gzip) среди available
+def choose_encoding(available=("br", "gzip")):
+    accepted = request.accept_encodings
+    for encoding in available:
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=current_app.config["COMPRESS_BROTLI_QUALITY"])
+    return gzip.compress(data, compresslevel=current_app.config["COMPRESS_LEVEL"])
+
+
+# Сжатие динамических ответов больше COMPRESS_MIN_SIZE байт.
+# Файлы (direct_passthrough) и потоковые ответы не сжимаются.
+def compress_response(response):
+    response.vary.add("Accept-Encoding")
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config["COMPRESS_MIN_SIZE"]:
+        return response
+
+    encoding = choose_encoding()
+    if not encoding:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    # сжатое представление отличается от исходного побайтно
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+# Заранее сжатая копия статического файла (name.br или name.gz), если клиент её принимает
+def precompressed(static_folder, name):
+    encodings = [encoding for encoding in ("br", "gzip")
+                 if os.path.isfile(os.path.join(static_folder, name + (".br" if encoding == "br" else ".gz")))]
+    encoding = choose_encoding(encodings) if encodings else None
+    if encoding == "br":
+        return name + ".br", encoding
+    if encoding == "gzip":
+        return name + ".gz", encoding
+    return name, None
+
+
+# Создание .gz и .br рядом с текстовыми статическими файлами
+def compress_static(static_folder):
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        for filename in filenames:
+            if not filename.endswith(STATIC_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9))
+            if brotli is not None:
+                with open(path + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+            count += 1
+    return count
+
+
+def init_app(app):
+    if app.config["COMPRESS_RESPONSES"]:
+        app.after_request(compress_response)
@@ -0,0 +1,80 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+import delive.catalog as catalog
+
+
+# Вариант страницы для текущего посетителя: от сессии зависят шапка (вход, корзина) и т.п.
+def session_variant():
+    user = session.get("user")
+    if not user and not session.get("cart"):
+        return "anonymous"
+    return "{}:{}:{}:{}".format(user["id"] if user else "", user["role"] if user else "",
+                                session.get("count", 0), session.get("total", 0))
+
+
+# Валидаторы страницы каталога: ETag и Last-Modified.
+# Случайная выборка блюд меняется раз в интервал кэша фрагментов, поэтому он тоже входит в ETag.
+# bucketed=False - ответ без случайной выборки зависит только от версии каталога.
+def catalog_validators(snapshot, variant, bucketed=True):
+    ttl = current_app.config["FRAGMENT_CACHE_TTL"]
+    bucket = int(datetime.now(timezone.utc).timestamp() // ttl) if bucketed else 0
+    key = f"{snapshot.version}:{bucket}:{variant}:{request.path}:{request.query_string.decode()}"
+    etag = hashlib.md5(key.encode()).hexdigest()
+
+    last_modified = datetime.fromtimestamp(bucket * ttl, timezone.utc)
+    if snapshot.updated:
+        last_modified = max(last_modified, snapshot.updated.replace(tzinfo=timezone.utc))
+    return etag, last_modified.replace(microsecond=0)
+
+
+def set_validators(response, etag, last_modified, per_session=True):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    if per_session:
+        # страница зависит от сессии, поэтому кэшируется только браузером и всегда проверяется
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Cookie")
+    else:
+        response.headers["Cache-Control"] = "public, no-cache"
+    return response
+
+
+# Условный GET для каталога: если каталог и вариант ответа не изменились,
+# ответ 304 отдаётся без обращения к БД за каталогом и без отрисовки шаблона.
+# per_session=False - ответ одинаков для всех посетителей и не содержит случайной выборки (API каталога).
+def conditional_view(f, per_session=True):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # сообщения flash должны быть показаны, поэтому такие ответы не кэшируются
+        if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+            return f(*args, **kwargs)
+
+        variant = session_variant() if per_session else "anonymous"
+        etag, last_modified = catalog_validators(catalog.get_snapshot(), variant, bucketed=per_session)
+
+        not_modified = request.if_none_match.contains_weak(etag)
+        # дата не различает посетителей, поэтому по ней проверяется только анонимный вариант
+        if not request.if_none_match and request.if_modified_since and variant == "anonymous":
+            not_modified = last_modified <= request.if_modified_since.replace(tzinfo=timezone.utc)
+
+        if not_modified:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+        return set_validators(response, etag, last_modified, per_session)
+
+    return decorated_function
+
+
+# Страницы каталога, в шапке которых есть данные сессии
+def catalog_conditional(f):
+    return conditional_view(f, per_session=True)
+
+
+# Данные каталога, одинаковые для всех посетителей
+def public_catalog_conditional(f):
+    return conditional_view(f, per_session=False)
@@ -1,6 +1,7 @@
 import json
 import os
 import secrets
+import tempfile
 
 from flask import abort
 current_path = os.path.dirname(os.path.realpath(__file__))
@@ -26,10 +27,137 @@ def load_config():
     abort(500, description="Ошибка конфигурации")
 
 
+# Общий для всех процессов ключ: из переменной окружения, из config.json
+# или из файла data/secret_key, который создаётся при первом запуске. Файл общий только для процессов
+# одной машины: при нескольких dyno SECRET_KEY задаётся явно, иначе сессии не переживут смену dyno
+def load_secret_key(config_data):
+    key = os.getenv("SECRET_KEY") or config_data.get("secret_key")
+    if key:
+        return key
+    
+    # файл появляется атомарно, поэтому все процессы прочитают один и тот же ключ
+    path = f'{current_path}/data/secret_key'
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            f.write(secrets.token_urlsafe(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+
+# Параметр из переменной окружения (имя в верхнем регистре) или из config.json
+def setting(config_data, name, default):
+    value = os.getenv(name.upper())
+    if value is None:
+        return config_data.get(name, default)
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+# Строка подключения к реплике для чтения (как и основная, может браться из переменной окружения: env:ИМЯ)
+def load_replica_uri(config_data):
+    uri = config_data.get("replica_db_uri")
+    if uri and uri[0:4] == "env:":
+        return os.getenv(uri[4:])
+    return uri
+
+
+# Параметры пула соединений и ограничение времени подключения (PostgreSQL).
+# Для SQLite параметры пула не применяются (delive.routing).
+def engine_options(config_data):
+    return {
+        "pool_size": setting(config_data, "db_pool_size", 5),
+        "max_overflow": setting(config_data, "db_max_overflow", 10),
+        "pool_timeout": setting(config_data, "db_pool_timeout", 10),
+        "pool_recycle": setting(config_data, "db_pool_recycle", 1800),
+        "pool_pre_ping": setting(config_data, "db_pool_pre_ping", True),
+        "connect_args": {"connect_timeout": setting(config_data, "db_connect_timeout", 5)},
+    }
+
 
 class Config:
     DEBUG = False
-    SECRET_KEY = secrets.token_urlsafe()
     config = load_config()
+    SECRET_KEY = load_secret_key(config)
     SQLALCHEMY_DATABASE_URI = config["db_uri"]
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(config)
+    # ограничение времени SQL-запроса в транзакциях веб-запросов, мс (PostgreSQL, SET LOCAL);
+    # команды CLI, миграции и перестроение сводок выполняются без ограничения; 0 - без ограничения
+    DB_STATEMENT_TIMEOUT = setting(config, "db_statement_timeout", 0)
+    # реплика для чтения в обработчиках с routing.read_only; при недоступности
+    # чтение идёт из основной БД, повторная попытка - через REPLICA_RETRY_INTERVAL секунд
+    REPLICA_DB_URI = load_replica_uri(config)
+    SQLALCHEMY_BINDS = {"replica": REPLICA_DB_URI} if REPLICA_DB_URI else None
+    REPLICA_RETRY_INTERVAL = setting(config, "replica_retry_interval", 30)
+    # как часто (в секундах) сверять версию каталога в БД
+    CATALOG_VERSION_CHECK_INTERVAL = config.get("catalog_version_check_interval", 5)
+    # случайные блюда для главной отбираются в БД (для больших каталогов)
+    CATALOG_SAMPLE_IN_DB = config.get("catalog_sample_in_db", False)
+    # хранилище сессий: sql (таблица sessions), redis или cookie
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND") or config.get("session_backend", "sql")
+    # отдельная БД для сессий, например sqlite:////tmp/sessions.db (по умолчанию - основная БД)
+    SESSION_DB_URI = os.getenv("SESSION_DB_URI") or config.get("session_db_uri")
+    SESSION_REDIS_URL = os.getenv("REDIS_URL") or config.get("session_redis_url", "redis://localhost:6379/0")
+    # количество заказов на одной странице личного кабинета
+    ACCOUNT_ORDERS_PAGE_SIZE = config.get("account_orders_page_size", 20)
+    # параметры хэширования паролей (при изменении хэш пересчитывается при входе)
+    PASSWORD_HASH_METHOD = config.get("password_hash_method", "pbkdf2:sha256:150000")
+    PASSWORD_SALT_LENGTH = config.get("password_salt_length", 16)
+    # процессов для хэширования (0 - в процессе веб-сервера) и запросов в очереди к ним
+    PASSWORD_POOL_WORKERS = config.get("password_pool_workers", 2)
+    PASSWORD_QUEUE_LIMIT = config.get("password_queue_limit", 8)
+    # адреса статических файлов с хэшем содержимого и кэшированием навсегда
+    ASSETS_FINGERPRINT = config.get("assets_fingerprint", True)
+    # сжатие ответов: gzip (и brotli, если установлен пакет brotli) для ответов больше COMPRESS_MIN_SIZE байт
+    COMPRESS_RESPONSES = config.get("compress_responses", True)
+    COMPRESS_MIN_SIZE = config.get("compress_min_size", 500)
+    COMPRESS_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5
+    # кэш фрагментов шаблонов: число фрагментов и время жизни (и интервал обновления случайной выборки), с
+    FRAGMENT_CACHE_SIZE = config.get("fragment_cache_size", 256)
+    FRAGMENT_CACHE_TTL = config.get("fragment_cache_ttl", 60)
+    # количество блюд в ряду "Хиты" на главной
+    POPULAR_DISHES_COUNT = config.get("popular_dishes_count", 3)
+    # блюд на странице результатов поиска
+    SEARCH_PAGE_SIZE = config.get("search_page_size", 12)
+    # JSON API: блюд на странице по умолчанию и наибольшее допустимое значение per_page
+    API_PAGE_SIZE = config.get("api_page_size", 50)
+    API_MAX_PAGE_SIZE = config.get("api_max_page_size", 200)
+    # админка: начиная с этого числа строк в таблице общее количество в списке берётся
+    # из статистики планировщика PostgreSQL (pg_class.reltuples) вместо COUNT(*); 0 - всегда точно
+    ADMIN_COUNT_ESTIMATE_THRESHOLD = config.get("admin_count_estimate_threshold", 100000)
+    # замеры запросов (delive.profiling): число и время SQL-запросов и шаблонов в заголовке Server-Timing
+    # (admin - только администратору, all - всем, off - никому);
+    # запросы дольше PROFILING_SLOW_REQUEST_MS мс или с одинаковым SQL-запросом PROFILING_REPEATED_QUERIES
+    # и более раз пишутся в журнал медленных запросов (файл PROFILING_SLOW_LOG или общий журнал)
+    PROFILING_ENABLED = setting(config, "profiling_enabled", True)
+    PROFILING_SERVER_TIMING = setting(config, "profiling_server_timing", "admin")
+    PROFILING_SLOW_REQUEST_MS = setting(config, "profiling_slow_request_ms", 500)
+    PROFILING_REPEATED_QUERIES = setting(config, "profiling_repeated_queries", 10)
+    PROFILING_SLOWEST_STATEMENTS = 5
+    PROFILING_SLOW_LOG = setting(config, "profiling_slow_log", None)
+    # доля запросов, выполняемых под профилировщиком (cprofile или pyinstrument), и папка для результатов
+    PROFILING_SAMPLE_RATE = setting(config, "profiling_sample_rate", 0.0)
+    PROFILING_PROFILER = setting(config, "profiling_profiler", "cprofile")
+    PROFILING_DIR = setting(config, "profiling_dir", os.path.join(tempfile.gettempdir(), "delive-profiles"))
+    # /metrics доступен администратору или по заголовку Authorization: Bearer <токен> (для Prometheus)
+    METRICS_TOKEN = setting(config, "metrics_token", None)
+    # поток событий о статусе заказов (/account/events/): подключений на процесс, интервал пульса,
+    # наибольшая длительность соединения и интервал опроса БД (кроме PostgreSQL), с
+    ORDER_EVENTS_MAX_CONNECTIONS = config.get("order_events_max_connections", 8)
+    ORDER_EVENTS_HEARTBEAT = config.get("order_events_heartbeat", 15)
+    ORDER_EVENTS_MAX_DURATION = config.get("order_events_max_duration", 300)
+    ORDER_EVENTS_POLL_INTERVAL = config.get("order_events_poll_interval", 1)
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import queue
+import random
+import select
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, text
+
+from delive.models import db, OrderEvent
+
+CHANNEL = "order_events"
+# сколько хранятся события (для переподключения с Last-Event-ID)
+RETENTION = timedelta(days=1)
+# через сколько миллисекунд браузер переподключается после разрыва
+RETRY = 5000
+# id событий выдаются до фиксации транзакции, поэтому событие с меньшим id может появиться в таблице
+# позже события с большим: события за последние REREAD перечитываются, уже разосланные пропускаются
+REREAD = timedelta(seconds=30)
+
+logger = logging.getLogger(__name__)
+
+
+# Все подключения процесса к потоку событий заняты
+class EventStreamBusy(Exception):
+    pass
+
+
+# Параметры по умолчанию; переопределяются из конфигурации в init_app
+settings = {
+    "max_connections": 8,
+    "heartbeat": 15,
+    "max_duration": 300,
+    "poll_interval": 1,
+    "queue_size": 100,
+}
+
+_lock = threading.Lock()
+_hub = None
+_pid = None
+
+
+# Раздача событий подключённым покупателям внутри одного процесса.
+# Новые события читает из БД один фоновый поток: в PostgreSQL он просыпается по NOTIFY,
+# в остальных СУБД опрашивает таблицу order_events каждые poll_interval секунд.
+class Hub:
+    def __init__(self, engine):
+        self.engine = engine
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(settings["max_connections"])
+        self.last_id = 0
+        # разосланные события окна REREAD: id -> время создания
+        self.seen = {}
+        # события, созданные до запуска раздатчика, не рассылаются
+        self.dispatch(deliver=False)
+        self.thread = threading.Thread(target=self.run, name="order-events", daemon=True)
+        self.thread.start()
+
+    def subscribe(self, user_id):
+        if not self.slots.acquire(blocking=False):
+            raise EventStreamBusy()
+        events = queue.Queue(maxsize=settings["queue_size"])
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(events)
+        return events
+
+    def unsubscribe(self, user_id, events):
+        with self.lock:
+            subscribers = self.subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(events)
+                if not subscribers:
+                    del self.subscribers[user_id]
+        self.slots.release()
+
+    # Новые события из БД раздаются в очереди подписчиков-владельцев заказов. Читаются события
+    # после last_id и за последние REREAD (на случай поздней фиксации события с меньшим id).
+    # Без подписчиков события только отмечаются как разосланные: пропущенное новый подписчик
+    # получит по Last-Event-ID
+    def dispatch(self, deliver=True):
+        table = OrderEvent.__table__
+        since = datetime.utcnow() - REREAD
+        rows = self.engine.execute(
+            table.select().where(or_(table.c.id > self.last_id, table.c.created >= since)).order_by(table.c.id)
+        ).fetchall()
+        with self.lock:
+            for row in rows:
+                if row.id in self.seen:
+                    continue
+                self.seen[row.id] = row.created
+                self.last_id = max(self.last_id, row.id)
+                if not deliver:
+                    continue
+                for events in self.subscribers.get(row.user_id, ()):
+                    try:
+                        events.put_nowait(row)
+                    except queue.Full:
+                        pass
+            self.seen = {event_id: created for event_id, created in self.seen.items() if created >= since}
+
+    def run(self):
+        while True:
+            try:
+                if self.engine.dialect.name == "postgresql":
+                    self.listen()
+                else:
+                    self.poll()
+            except Exception:
+                logger.exception("Ошибка чтения событий заказов")
+                time.sleep(settings["poll_interval"])
+
+    def poll(self):
+        while True:
+            self.dispatch()
+            time.sleep(settings["poll_interval"])
+
+    # LISTEN на отдельном соединении (вне пула); по истечении heartbeat таблица проверяется и без уведомления
+    def listen(self):
+        connection = self.engine.raw_connection()
+        connection.detach()
+        try:
+            raw = connection.connection
+            raw.autocommit = True
+            raw.cursor().execute(f"LISTEN {CHANNEL}")
+            self.dispatch()
+            while True:
+                if select.select([raw], [], [], settings["heartbeat"])[0]:
+                    raw.poll()
+                    del raw.notifies[:]
+                self.dispatch()
+        finally:
+            connection.close()
+
+
+# Раздатчик событий создаётся лениво в каждом процессе gunicorn (после fork)
+def get_hub():
+    global _hub, _pid
+
+    with _lock:
+        if _hub is None or _pid != os.getpid():
+            _hub = Hub(db.get_engine(current_app))
+            _pid = os.getpid()
+        return _hub
+
+
+# Запись события об изменении статуса заказа в текущей транзакции.
+# В PostgreSQL уведомление NOTIFY доставляется слушателям после фиксации транзакции.
+def publish(order):
+    publish_many([(order.id, order.user_id)], int(order.status))
+
+
+# События для нескольких заказов, получивших один статус: одна вставка и одно уведомление
+def publish_many(orders, status):
+    if not orders:
+        return
+    db.session.execute(OrderEvent.__table__.insert(),
+                       [{"order_id": order_id, "user_id": user_id, "status": status} for order_id, user_id in orders])
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                           {"channel": CHANNEL, "payload": str(orders[0][0])})
+
+    # изредка удаляем старые события
+    if random.random() < 0.01:
+        db.session.query(OrderEvent).filter(OrderEvent.created < datetime.utcnow() - RETENTION) \
+            .delete(synchronize_session=False)
+
+
+# События, пропущенные клиентом за время переподключения
+def missed_events(user_id, last_event_id):
+    return db.session.query(OrderEvent).filter(OrderEvent.user_id == user_id, OrderEvent.id > last_event_id) \
+        .order_by(OrderEvent.id).limit(settings["queue_size"]).all()
+
+
+def format_event(event, data):
+    return f"id: {event.id}\nevent: status\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# Поток text/event-stream для покупателя. Соединение закрывается через max_duration секунд,
+# браузер переподключается сам и передаёт Last-Event-ID.
+def stream_response(user_id, last_event_id, describe):
+    hub = get_hub()
+    missed = missed_events(user_id, last_event_id) if last_event_id is not None else []
+    events = hub.subscribe(user_id)
+
+    def generate():
+        deadline = time.monotonic() + settings["max_duration"]
+        yield f"retry: {RETRY}\n\n"
+        for event in missed:
+            yield format_event(event, describe(event))
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = events.get(timeout=min(settings["heartbeat"], remaining))
+            except queue.Empty:
+                # комментарий-пульс не даёт прокси закрыть неактивное соединение
+                yield ": ping\n\n"
+                continue
+            yield format_event(event, describe(event))
+
+    response = current_app.response_class(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    # место освобождается при закрытии соединения, даже если поток не был начат
+    response.call_on_close(lambda: hub.unsubscribe(user_id, events))
+    return response
+
+
+def init_app(app):
+    settings.update(
+        max_connections=app.config["ORDER_EVENTS_MAX_CONNECTIONS"],
+        heartbeat=app.config["ORDER_EVENTS_HEARTBEAT"],
+        max_duration=app.config["ORDER_EVENTS_MAX_DURATION"],
+        poll_interval=app.config["ORDER_EVENTS_POLL_INTERVAL"],
+    )
@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from flask import Response, abort, request, stream_with_context
+from sqlalchemy import select
+
+from delive import app, db
+from delive.models import User, Dish, Order, dishes_orders
+from delive.views import admin_only
+
+# Выгружаемые таблицы и их столбцы (хэш пароля не выгружается)
+EXPORTS = {
+    "orders": [c for c in Order.__table__.columns],
+    "dishes": [c for c in Dish.__table__.columns],
+    "users": [c for c in User.__table__.columns if c.name != "password_hash"],
+}
+BATCH_SIZE = 1000
+
+
+# Дата из параметра запроса в формате ГГГГ-ММ-ДД
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+# Условия отбора из параметров запроса: status, id_from, id_to, date_from, date_to (включительно, UTC)
+def export_filters(table):
+    conditions = []
+    status = request.args.get("status", type=int)
+    if status is not None and "status" in table.c:
+        conditions.append(table.c.status == status)
+    id_from = request.args.get("id_from", type=int)
+    if id_from is not None:
+        conditions.append(table.c.id >= id_from)
+    id_to = request.args.get("id_to", type=int)
+    if id_to is not None:
+        conditions.append(table.c.id <= id_to)
+    if "created_at" in table.c:
+        date_from = request.args.get("date_from", type=parse_date)
+        if date_from is not None:
+            conditions.append(table.c.created_at >= date_from)
+        date_to = request.args.get("date_to", type=parse_date)
+        if date_to is not None:
+            conditions.append(table.c.created_at < date_to + timedelta(days=1))
+    return conditions
+
+
+# Названия блюд для порции заказов - один запрос на порцию
+def load_order_dishes(conn, order_ids):
+    dishes = {}
+    query = select([dishes_orders.c.order_id, Dish.__table__.c.title]) \
+        .select_from(dishes_orders.join(Dish.__table__, Dish.__table__.c.id == dishes_orders.c.dish_id)) \
+        .where(dishes_orders.c.order_id.in_(order_ids))
+    for order_id, title in conn.execute(query):
+        dishes.setdefault(order_id, []).append(title)
+    return dishes
+
+
+# Строки выгрузки порциями. Курсор на стороне сервера (stream_results), поэтому
+# расход памяти не зависит от размера таблицы.
+def iter_batches(engine, name, conditions):
+    columns = EXPORTS[name]
+    table = columns[0].table
+    query = select(columns).order_by(table.c.id)
+    for condition in conditions:
+        query = query.where(condition)
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(query)
+        # связи заказов загружаются отдельным соединением, пока открыт курсор
+        with engine.connect() as relations_conn:
+            while True:
+                rows = result.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                records = [dict(row) for row in rows]
+                if name == "orders":
+                    dishes = load_order_dishes(relations_conn, [record["id"] for record in records])
+                    for record in records:
+                        record["dishes"] = dishes.get(record["id"], [])
+                yield records
+
+
+def write_csv(batches, fieldnames):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction="ignore")
+    # BOM, чтобы Excel правильно определил кодировку
+    buf.write("\ufeff")
+    writer.writeheader()
+    for records in batches:
+        for record in records:
+            if "dishes" in record:
+                record["dishes"] = "; ".join(record["dishes"])
+            writer.writerow(record)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def write_jsonl(batches):
+    for records in batches:
+        yield "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+
+
+# Потоковая выгрузка таблицы в CSV или JSONL: /export/orders/?format=jsonl&status=3
+@app.route('/export/<name>/')
+@admin_only
+def export_table(name):
+    if name not in EXPORTS:
+        abort(404)
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "jsonl"):
+        abort(400, description="Формат выгрузки: csv или jsonl")
+
+    table = EXPORTS[name][0].table
+    batches = iter_batches(db.engine, name, export_filters(table))
+
+    if fmt == "csv":
+        fieldnames = [c.name for c in EXPORTS[name]] + (["dishes"] if name == "orders" else [])
+        body, mimetype = write_csv(batches, fieldnames), "text/csv"
+    else:
+        body, mimetype = write_jsonl(batches), "application/x-ndjson"
+
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={name}.{fmt}"})
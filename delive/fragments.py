@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+import delive.metrics as metrics
+
+
+# Ограниченный по размеру LRU-кэш с временем жизни записей
+# Попадания и промахи кэша с именем name учитываются в метриках (/metrics).
+class LRUCache:
+    def __init__(self, maxsize=256, ttl=60, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self._get(key)
+        if self.name:
+            metrics.cache_lookup(self.name, value is not None)
+        return value
+
+    def _get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Тег {% cache ключ1, ключ2, ... %} ... {% endcache %}:
+# HTML фрагмента сохраняется в кэше процесса и повторно не отрисовывается
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=LRUCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [nodes.List(key)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        key = tuple(key)
+        value = self.environment.fragment_cache.get(key)
+        if value is None:
+            value = caller()
+            self.environment.fragment_cache.set(key, value)
+        return value
+
+
+# Номер текущего интервала длиной FRAGMENT_CACHE_TTL секунд:
+# фрагменты со случайной выборкой обновляются раз в интервал
+def fragment_bucket():
+    return int(time.time() // current_app.config["FRAGMENT_CACHE_TTL"])
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = LRUCache(app.config["FRAGMENT_CACHE_SIZE"], app.config["FRAGMENT_CACHE_TTL"],
+                                            "fragments")
+    app.add_template_global(fragment_bucket)
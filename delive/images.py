@@ -0,0 +1,145 @@
+import hashlib
+import os
+import tempfile
+
+import click
+from flask import abort, redirect, send_file, url_for
+from flask.cli import AppGroup
+from markupsafe import Markup, escape
+
+import delive.config as config
+import delive.sessions as sessions
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PICTURES_PATH = f'{config.current_path}/static/pictures'
+DERIVED_PATH = f'{PICTURES_PATH}/derived'
+
+# Ширины уменьшенных копий: карточка блюда 300px, копии для экранов 1.5x и 2x
+WIDTHS = (300, 450, 600)
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+DEFAULT_SIZES = "(max-width: 576px) 100vw, 300px"
+
+# Хэши содержимого исходных изображений: имя -> (время изменения, хэш)
+_hashes = {}
+
+
+# Исходное изображение блюда (только файлы из static/pictures)
+def source_path(picture):
+    if not picture or os.path.basename(picture) != picture:
+        return None
+    path = os.path.join(PICTURES_PATH, picture)
+    return path if os.path.isfile(path) else None
+
+
+# Короткий хэш содержимого, пересчитывается только при изменении файла
+def content_hash(picture):
+    path = source_path(picture)
+    if not path:
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _hashes.get(picture)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.md5(f.read()).hexdigest()[:10]
+    _hashes[picture] = (mtime, digest)
+    return digest
+
+
+def derived_name(picture, digest, width, fmt):
+    return f'{os.path.splitext(picture)[0]}-{digest}-{width}.{fmt}'
+
+
+# Создание уменьшенной копии, если её ещё нет на диске. Возвращает путь к файлу.
+def build(picture, width, fmt):
+    digest = content_hash(picture)
+    if not digest or Image is None:
+        return None
+
+    path = os.path.join(DERIVED_PATH, derived_name(picture, digest, width, fmt))
+    if os.path.isfile(path):
+        return path
+
+    os.makedirs(DERIVED_PATH, exist_ok=True)
+    with Image.open(source_path(picture)) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        # запись в свой временный файл и переименование, чтобы другой процесс или поток
+        # не отдал недописанный файл
+        fd, tmp_path = tempfile.mkstemp(dir=DERIVED_PATH, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, FORMATS[fmt], quality=80, optimize=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return path
+
+
+# Все копии одного изображения (при загрузке каталога и изменении блюда)
+def build_all(picture):
+    return [build(picture, width, fmt) for width in WIDTHS for fmt in FORMATS]
+
+
+# Отдача копии; при первом обращении она создаётся. Адрес с устаревшим хэшем
+# перенаправляется на адрес текущего изображения
+def render_picture(digest, width, picture, fmt):
+    if width not in WIDTHS or fmt not in FORMATS:
+        abort(404)
+    current = content_hash(picture)
+    if not current:
+        abort(404)
+    if digest != current:
+        return redirect(url_for("render_picture", digest=current, width=width, picture=picture, fmt=fmt))
+    path = build(picture, width, fmt)
+    if not path:
+        abort(404)
+
+    response = send_file(path, mimetype=f'image/{fmt}', conditional=True)
+    # адрес содержит хэш содержимого, поэтому файл можно кэшировать навсегда
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+# Тег <picture> с WebP и JPEG разных ширин для карточки блюда
+def picture_tag(picture, alt="", css_class="", width=300, height=200, sizes=DEFAULT_SIZES):
+    attrs = f'width="{width}" height="{height}" class="{escape(css_class)}" alt="{escape(alt)}" loading="lazy"'
+    digest = content_hash(picture)
+    if not digest or Image is None:
+        return Markup(f'<img src="{url_for("static", filename="pictures/" + picture)}" {attrs}>')
+
+    def srcset(fmt):
+        return ", ".join(f'{url_for("render_picture", digest=digest, width=w, picture=picture, fmt=fmt)} {w}w'
+                         for w in WIDTHS)
+
+    src = url_for("render_picture", digest=digest, width=WIDTHS[0], picture=picture, fmt="jpeg")
+    return Markup(f'<picture><source type="image/webp" srcset="{srcset("webp")}" sizes="{sizes}">'
+                  f'<img src="{src}" srcset="{srcset("jpeg")}" sizes="{sizes}" {attrs}></picture>')
+
+
+images_cli = AppGroup("images", help="Уменьшенные копии изображений блюд")
+
+
+@images_cli.command("build")
+def build_command():
+    """Создание уменьшенных копий всех изображений из static/pictures"""
+    if Image is None:
+        raise click.ClickException("Для обработки изображений необходимо установить пакет Pillow")
+    pictures = [name for name in sorted(os.listdir(PICTURES_PATH)) if source_path(name)]
+    for picture in pictures:
+        build_all(picture)
+    click.echo(f"Обработано изображений: {len(pictures)}")
+
+
+def init_app(app):
+    app.add_url_rule('/pictures/<digest>/<int:width>/<picture>.<fmt>', 'render_picture', render_picture)
+    # уменьшенные копии отдаются без загрузки сессии, как статические файлы
+    sessions.no_session('/pictures/')
+    app.add_template_global(picture_tag)
+    app.cli.add_command(images_cli)
@@ -0,0 +1,200 @@
+import csv
+import io
+import time
+from collections import namedtuple
+from functools import partial
+from itertools import islice
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import String, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError
+
+import delive.catalog as catalog
+import delive.config as config
+import delive.images as images
+from delive.models import db, Category, Dish
+
+# Итог загрузки одного файла: сколько строк загружено, ошибки по строкам и время
+ImportResult = namedtuple("ImportResult", ["table", "rows", "errors", "seconds"])
+
+DEFAULT_CATEGORIES = f'{config.current_path}/data/category.csv'
+DEFAULT_DISHES = f'{config.current_path}/data/source_data.csv'
+CHUNK_SIZE = 1000
+
+
+# Значение не длиннее столбца (иначе PostgreSQL отклонит всю порцию)
+def check_length(table, column, value):
+    length = table.c[column].type.length
+    if length and len(value) > length:
+        raise ValueError(f"{column}: длиннее {length} символов")
+
+
+# Разбор строки файла категорий: id|title
+def parse_category(fields):
+    if len(fields) < 2:
+        raise ValueError("ожидается 2 поля: id|title")
+    title = fields[1].strip()
+    if not title:
+        raise ValueError("пустое название категории")
+    check_length(Category.__table__, "title", title)
+    return {"id": int(fields[0]), "title": title}
+
+
+# Разбор строки файла блюд: id|title|price|description|picture|category_id.
+# category_ids - существующие категории: блюдо с несуществующей категорией считается ошибкой строки
+def parse_dish(fields, category_ids=None):
+    if len(fields) < 6:
+        raise ValueError("ожидается 6 полей: id|title|price|description|picture|category_id")
+    title = fields[1].strip()
+    if not title:
+        raise ValueError("пустое название блюда")
+    price = int(fields[2])
+    if price < 0:
+        raise ValueError("отрицательная цена")
+    if not fields[3].strip():
+        raise ValueError("пустое описание блюда")
+    check_length(Dish.__table__, "title", title)
+    check_length(Dish.__table__, "picture", fields[4])
+    category_id = int(fields[5])
+    if category_ids is not None and category_id not in category_ids:
+        raise ValueError(f"нет категории с id {category_id}")
+    return {"id": int(fields[0]), "title": title, "price": price, "description": fields[3],
+            "picture": fields[4], "category_id": category_id}
+
+
+# Построчное чтение файла: пары (номер строки, значения) или (номер строки, ошибка)
+def read_rows(f, parse, errors):
+    reader = csv.reader(f, delimiter='|', quoting=csv.QUOTE_NONE)
+    next(reader, None)  # заголовок
+    for fields in reader:
+        if not fields:
+            continue
+        try:
+            yield parse(fields)
+        except ValueError as e:
+            errors.append((reader.line_num, str(e)))
+
+
+# Вставка или обновление порции строк по первичному ключу
+def upsert_chunk(conn, table, rows, use_copy):
+    columns = [c.name for c in table.columns]
+    updates = [c for c in columns if c != "id"]
+    dialect = conn.dialect.name
+
+    if dialect == "postgresql" and use_copy:
+        # COPY во временную таблицу и перенос одним INSERT ... ON CONFLICT
+        conn.execute(text(f"CREATE TEMP TABLE staging (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP"))
+        buf = io.StringIO()
+        csv.writer(buf).writerows([row[c] for c in columns] for row in rows)
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        # в формате csv пустое поле без кавычек читается как NULL: пустые строки текстовых столбцов
+        # должны остаться пустыми строками (NOT NULL)
+        text_columns = [c.name for c in table.columns if isinstance(c.type, String)]
+        force_not_null = f", FORCE_NOT_NULL ({', '.join(text_columns)})" if text_columns else ""
+        cursor.copy_expert(f"COPY staging ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv{force_not_null})", buf)
+        conn.execute(text(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM staging "
+            f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in updates)}"))
+    elif dialect == "postgresql":
+        stmt = pg_insert(table)
+        conn.execute(stmt.on_conflict_do_update(index_elements=["id"],
+                                                set_={c: stmt.excluded[c] for c in updates}), rows)
+    elif dialect == "sqlite":
+        conn.execute(text(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)}) "
+            f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in updates)}"), rows)
+    else:
+        existing = {row[0] for row in conn.execute(
+            table.select().with_only_columns([table.c.id]).where(table.c.id.in_([row["id"] for row in rows])))}
+        for row in rows:
+            if row["id"] in existing:
+                conn.execute(table.update().where(table.c.id == row["id"]).values(row))
+            else:
+                conn.execute(table.insert().values(row))
+
+
+# Потоковая загрузка файла порциями по chunk_size строк, каждая порция - в своей транзакции.
+# Повторная загрузка того же файла безопасна: существующие записи обновляются.
+# Ошибки - пары (номер строки, сообщение); если файл не открылся, номер строки - None.
+def import_file(path, table, parse, chunk_size=CHUNK_SIZE, use_copy=True):
+    errors = []
+    count = 0
+    started = time.perf_counter()
+
+    try:
+        f = open(path, 'r', newline='')
+    except OSError as e:
+        errors.append((None, f"не удалось открыть файл {path}: {e.strerror}"))
+        return ImportResult(table.name, count, errors, time.perf_counter() - started)
+
+    with f:
+        rows = read_rows(f, parse, errors)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            # повторы id внутри порции: остаётся последняя строка
+            chunk = list({row["id"]: row for row in chunk}.values())
+            try:
+                with db.engine.begin() as conn:
+                    upsert_chunk(conn, table, chunk, use_copy)
+            except DBAPIError as e:
+                # порция отклонена БД целиком, остальные порции загружаются
+                ids = [row["id"] for row in chunk]
+                errors.append((None, f"строки с id {min(ids)}-{max(ids)} не загружены: {e.orig}".strip()))
+                continue
+            count += len(chunk)
+
+    if db.engine.dialect.name == "postgresql":
+        # после вставки явных id последовательность должна продолжаться с максимального id
+        with db.engine.begin() as conn:
+            conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                              f"COALESCE((SELECT max(id) FROM {table.name}), 1))"))
+
+    return ImportResult(table.name, count, errors, time.perf_counter() - started)
+
+
+# Загрузка категорий и блюд (категории первыми - на них ссылаются блюда)
+def import_catalog(categories_path=DEFAULT_CATEGORIES, dishes_path=DEFAULT_DISHES, chunk_size=CHUNK_SIZE,
+                   use_copy=True, build_images=True):
+    results = []
+    if categories_path:
+        results.append(import_file(categories_path, Category.__table__, parse_category, chunk_size, use_copy))
+    if dishes_path:
+        category_ids = {row[0] for row in db.session.query(Category.id)}
+        results.append(import_file(dishes_path, Dish.__table__, partial(parse_dish, category_ids=category_ids),
+                                   chunk_size, use_copy))
+        if build_images:
+            for picture in db.session.query(Dish.picture).distinct():
+                images.build_all(picture[0])
+
+    catalog.bump_version()
+    return results
+
+
+catalog_cli = AppGroup("catalog", help="Работа с каталогом блюд")
+
+
+@catalog_cli.command("import")
+@click.option("--categories", "categories_path", default=DEFAULT_CATEGORIES, show_default=True,
+              help="Файл категорий (id|title)")
+@click.option("--dishes", "dishes_path", default=DEFAULT_DISHES, show_default=True,
+              help="Файл блюд (id|title|price|description|picture|category_id)")
+@click.option("--chunk-size", default=CHUNK_SIZE, show_default=True, help="Строк в одной транзакции")
+@click.option("--copy/--no-copy", "use_copy", default=True, help="Использовать COPY в PostgreSQL")
+@click.option("--images/--no-images", "build_images", default=True, help="Создать уменьшенные копии изображений")
+def import_command(categories_path, dishes_path, chunk_size, use_copy, build_images):
+    """Загрузка или обновление каталога из файлов с разделителем |"""
+    for result in import_catalog(categories_path, dishes_path, chunk_size, use_copy, build_images):
+        speed = result.rows / result.seconds if result.seconds else 0
+        click.echo(f"{result.table}: {result.rows} строк за {result.seconds:.2f} с ({speed:.0f} строк/с), "
+                   f"ошибок: {len(result.errors)}")
+        for line, message in result.errors:
+            click.echo(f"  строка {line}: {message}" if line is not None else f"  {message}", err=True)
+
+
+def init_app(app):
+    app.cli.add_command(catalog_cli)
@@ -0,0 +1,109 @@
+import hmac
+import os
+import time
+
+from flask import abort, current_app, g, request, session
+from sqlalchemy.pool import QueuePool
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+from delive.models import db
+
+# Границы интервалов гистограммы времени ответа, с
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Метрики создаются при импорте: в режиме нескольких процессов gunicorn (переменная prometheus_multiproc_dir,
+# задаётся в gunicorn.conf.py) значения каждого процесса пишутся в файлы и суммируются при чтении /metrics
+if prometheus_client is not None:
+    REQUEST_LATENCY = prometheus_client.Histogram(
+        "delive_request_duration_seconds", "Время обработки запроса", ["endpoint", "method"],
+        buckets=LATENCY_BUCKETS)
+    RESPONSES = prometheus_client.Counter(
+        "delive_responses_total", "Ответы по обработчикам и кодам", ["endpoint", "method", "status"])
+    POOL_CHECKED_OUT = prometheus_client.Gauge(
+        "delive_db_pool_checked_out", "Соединения, выданные из пула", ["database"], multiprocess_mode="livesum")
+    POOL_OVERFLOW = prometheus_client.Gauge(
+        "delive_db_pool_overflow", "Соединения сверх pool_size", ["database"], multiprocess_mode="livesum")
+    POOL_SIZE = prometheus_client.Gauge(
+        "delive_db_pool_size", "Размер пула соединений", ["database"], multiprocess_mode="livesum")
+    CHECKOUTS = prometheus_client.Counter("delive_checkouts_total", "Оформленные заказы")
+    REVENUE = prometheus_client.Counter("delive_checkout_revenue_total", "Сумма оформленных заказов, руб.")
+    CACHE_LOOKUPS = prometheus_client.Counter(
+        "delive_cache_lookups_total", "Обращения к кэшам процесса", ["cache", "result"])
+
+
+def start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+# Время и код ответа по имени обработчика (home, show_cart, render_addtocart, login, ...);
+# запросы без обработчика (404) учитываются под именем none
+def observe_response(response):
+    started = g.get("metrics_started")
+    if started is not None:
+        endpoint = request.endpoint or "none"
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        RESPONSES.labels(endpoint, request.method, str(response.status_code)).inc()
+        observe_pools()
+    return response
+
+
+# Состояние пулов соединений процесса (основная БД и реплика); у SQLite пула QueuePool нет
+def observe_pools():
+    engines = {"primary": db.get_engine(current_app)}
+    for bind in current_app.config.get("SQLALCHEMY_BINDS") or {}:
+        engines[bind] = db.get_engine(current_app, bind)
+    for name, engine in engines.items():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+            POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+            POOL_SIZE.labels(name).set(pool.size())
+
+
+# Оформленный заказ (вызывается после фиксации транзакции)
+def record_checkout(order):
+    if prometheus_client is not None:
+        CHECKOUTS.inc()
+        REVENUE.inc(order.total or 0)
+
+
+# Попадание или промах кэша процесса (delive.fragments.LRUCache с именем)
+def cache_lookup(cache, hit):
+    if prometheus_client is not None:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+# Доступ как у admin_only или по заголовку Authorization: Bearer <METRICS_TOKEN> (для Prometheus)
+def check_access():
+    token = current_app.config["METRICS_TOKEN"]
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return
+    user = session.get("user")
+    if user and user["role"] == 0:
+        return
+    abort(403, description="Вам сюда нельзя")
+
+
+# Метрики в текстовом формате Prometheus: в режиме нескольких процессов - сумма по всем процессам gunicorn
+def metrics_view():
+    check_access()
+    registry = prometheus_client.REGISTRY
+    if "prometheus_multiproc_dir" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return current_app.response_class(prometheus_client.generate_latest(registry),
+                                      headers={"Content-Type": prometheus_client.CONTENT_TYPE_LATEST})
+
+
+def init_app(app):
+    if prometheus_client is None:
+        app.logger.warning("Пакет prometheus_client не установлен, /metrics отключён")
+        return
+    app.before_request(start_timer)
+    app.after_request(observe_response)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,29 @@
+"""catalog version
+
+Revision ID: 5d1f7c2a9e40
+Revises: 3b3572ad38c5
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1f7c2a9e40'
+down_revision = '3b3572ad38c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalog_version = op.create_table('catalog_version',
+                                      sa.Column('id', sa.Integer(), nullable=False),
+                                      sa.Column('version', sa.Integer(), nullable=False),
+                                      sa.PrimaryKeyConstraint('id')
+                                      )
+    op.bulk_insert(catalog_version, [{'id': 1, 'version': 1}])
+
+
+def downgrade():
+    op.drop_table('catalog_version')
@@ -0,0 +1,31 @@
+"""server-side sessions
+
+Revision ID: 8a3e61b0c7d2
+Revises: 5d1f7c2a9e40
+Create Date: 2026-10-18 11:40:05.118930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a3e61b0c7d2'
+down_revision = '5d1f7c2a9e40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sessions',
+                    sa.Column('id', sa.String(length=64), nullable=False),
+                    sa.Column('data', sa.Text(), nullable=False),
+                    sa.Column('expires', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_sessions_expires'), 'sessions', ['expires'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_sessions_expires'), table_name='sessions')
+    op.drop_table('sessions')
@@ -0,0 +1,96 @@
+"""order timestamps and daily sales rollup
+
+Revision ID: a9d4e6f1c2b8
+Revises: f3c8d5e2a7b1
+Create Date: 2026-10-18 18:36:12.508843
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4e6f1c2b8'
+down_revision = 'f3c8d5e2a7b1'
+branch_labels = None
+depends_on = None
+
+CHUNK_SIZE = 1000
+# showdate() писал "18 октября 2020 г." (в феврале - с опечаткой "фераля")
+MONTHS = {"января": 1, "февраля": 2, "фераля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6, "июля": 7,
+          "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12}
+
+
+def parse_created(value):
+    try:
+        day, month, year = value.split()[:3]
+        return datetime(int(year), MONTHS[month], int(day))
+    except (AttributeError, KeyError, ValueError):
+        return None
+
+
+def upgrade():
+    op.add_column('orders', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_orders_created_at'), 'orders', ['created_at'], unique=False)
+    op.create_table('daily_sales',
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('status', sa.Integer(), nullable=False),
+                    sa.Column('orders', sa.Integer(), nullable=False),
+                    sa.Column('revenue', sa.Integer(), nullable=False),
+                    sa.Column('items', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('day', 'status')
+                    )
+
+    # перенос дат из строкового поля created порциями по id; заодно собирается сводка.
+    # Порции выполняются вне транзакции миграции (созданные выше столбец и таблица фиксируются),
+    # каждая порция - одна команда UPDATE и своя транзакция: на большой таблице блокировки строк
+    # и объём WAL не накапливаются до конца миграции
+    orders = sa.table('orders', sa.column('id', sa.Integer), sa.column('created', sa.String),
+                      sa.column('created_at', sa.DateTime), sa.column('status', sa.Integer),
+                      sa.column('total', sa.Integer))
+    dishes_orders = sa.table('dishes_orders', sa.column('order_id', sa.Integer))
+    # число блюд считается по индексу dishes_orders только для заказов текущей порции
+    dish_count = sa.select([sa.func.count()]).where(dishes_orders.c.order_id == orders.c.id) \
+        .as_scalar().label('dish_count')
+    rollup = {}
+    last_id = 0
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        while True:
+            rows = conn.execute(
+                sa.select([orders.c.id, orders.c.created, orders.c.status, orders.c.total, dish_count])
+                .where(orders.c.id > last_id).order_by(orders.c.id).limit(CHUNK_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = {}
+            for row in rows:
+                created_at = parse_created(row.created)
+                if created_at is None:
+                    continue
+                updates[row.id] = created_at
+                key = (created_at.date(), row.status or 0)
+                count, revenue, dishes = rollup.get(key, (0, 0, 0))
+                rollup[key] = (count + 1, revenue + (row.total or 0), dishes + (row.dish_count or 0))
+            if updates:
+                conn.execute(orders.update().where(orders.c.id.in_(list(updates)))
+                             .values(created_at=sa.case(updates, value=orders.c.id)))
+
+    if rollup:
+        daily_sales = sa.table('daily_sales', sa.column('day', sa.Date), sa.column('status', sa.Integer),
+                               sa.column('orders', sa.Integer), sa.column('revenue', sa.Integer),
+                               sa.column('items', sa.Integer))
+        op.bulk_insert(daily_sales, [{"day": day, "status": status, "orders": count, "revenue": revenue,
+                                      "items": dishes}
+                                     for (day, status), (count, revenue, dishes) in rollup.items()])
+
+
+def downgrade():
+    op.drop_table('daily_sales')
+    op.drop_index(op.f('ix_orders_created_at'), table_name='orders')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('created_at')
@@ -0,0 +1,37 @@
+"""dish popularity counters
+
+Revision ID: b62f0d8e4a13
+Revises: a9d4e6f1c2b8
+Create Date: 2026-10-18 20:14:37.902115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b62f0d8e4a13'
+down_revision = 'a9d4e6f1c2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dish_popularity',
+                    sa.Column('dish_id', sa.Integer(), nullable=False),
+                    sa.Column('orders', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('dish_id')
+                    )
+    op.create_table('dish_popularity_daily',
+                    sa.Column('dish_id', sa.Integer(), nullable=False),
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('orders', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('dish_id', 'day')
+                    )
+    op.create_index(op.f('ix_dish_popularity_daily_day'), 'dish_popularity_daily', ['day'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_dish_popularity_daily_day'), table_name='dish_popularity_daily')
+    op.drop_table('dish_popularity_daily')
+    op.drop_table('dish_popularity')
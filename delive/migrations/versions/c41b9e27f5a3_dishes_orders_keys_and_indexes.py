@@ -0,0 +1,49 @@
+"""dishes_orders primary key and foreign key indexes
+
+Revision ID: c41b9e27f5a3
+Revises: 8a3e61b0c7d2
+Create Date: 2026-10-18 12:58:44.730215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41b9e27f5a3'
+down_revision = '8a3e61b0c7d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # строки без заказа или блюда и повторы пар (заказ, блюдо) мешают созданию первичного ключа
+    op.execute("DELETE FROM dishes_orders WHERE order_id IS NULL OR dish_id IS NULL")
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DELETE FROM dishes_orders a USING dishes_orders b "
+                   "WHERE a.ctid < b.ctid AND a.order_id = b.order_id AND a.dish_id = b.dish_id")
+    else:
+        op.execute("DELETE FROM dishes_orders WHERE rowid NOT IN "
+                   "(SELECT min(rowid) FROM dishes_orders GROUP BY order_id, dish_id)")
+
+    with op.batch_alter_table('dishes_orders') as batch_op:
+        batch_op.alter_column('dish_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('order_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_primary_key('dishes_orders_pkey', ['order_id', 'dish_id'])
+        batch_op.create_index(batch_op.f('ix_dishes_orders_dish_id'), ['dish_id'], unique=False)
+
+    op.create_index(op.f('ix_orders_user_id'), 'orders', ['user_id'], unique=False)
+    op.create_index(op.f('ix_orders_status'), 'orders', ['status'], unique=False)
+    op.create_index(op.f('ix_dishes_category_id'), 'dishes', ['category_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_dishes_category_id'), table_name='dishes')
+    op.drop_index(op.f('ix_orders_status'), table_name='orders')
+    op.drop_index(op.f('ix_orders_user_id'), table_name='orders')
+
+    with op.batch_alter_table('dishes_orders') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_dishes_orders_dish_id'))
+        batch_op.drop_constraint('dishes_orders_pkey', type_='primary')
+        batch_op.alter_column('order_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('dish_id', existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,51 @@
+"""full-text dish search
+
+Revision ID: d7a1c3e5f9b2
+Revises: b62f0d8e4a13
+Create Date: 2026-10-18 21:48:03.226790
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a1c3e5f9b2'
+down_revision = 'b62f0d8e4a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # вычисляемые столбцы поддерживаются с PostgreSQL 12
+        op.execute("ALTER TABLE dishes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+                   "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+                   "setweight(to_tsvector('russian', coalesce(description, '')), 'B')) STORED")
+        op.execute("CREATE INDEX ix_dishes_search_vector ON dishes USING gin (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE dishes_fts USING fts5(title, description, content='dishes', "
+                   "content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+        op.execute("CREATE TRIGGER dishes_fts_ai AFTER INSERT ON dishes BEGIN "
+                   "INSERT INTO dishes_fts (rowid, title, description) VALUES (new.id, new.title, new.description); "
+                   "END")
+        op.execute("CREATE TRIGGER dishes_fts_ad AFTER DELETE ON dishes BEGIN "
+                   "INSERT INTO dishes_fts (dishes_fts, rowid, title, description) "
+                   "VALUES ('delete', old.id, old.title, old.description); END")
+        op.execute("CREATE TRIGGER dishes_fts_au AFTER UPDATE ON dishes BEGIN "
+                   "INSERT INTO dishes_fts (dishes_fts, rowid, title, description) "
+                   "VALUES ('delete', old.id, old.title, old.description); "
+                   "INSERT INTO dishes_fts (rowid, title, description) VALUES (new.id, new.title, new.description); "
+                   "END")
+        op.execute("INSERT INTO dishes_fts (dishes_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX ix_dishes_search_vector")
+        op.execute("ALTER TABLE dishes DROP COLUMN search_vector")
+    elif dialect == 'sqlite':
+        for trigger in ('dishes_fts_au', 'dishes_fts_ad', 'dishes_fts_ai'):
+            op.execute(f"DROP TRIGGER {trigger}")
+        op.execute("DROP TABLE dishes_fts")
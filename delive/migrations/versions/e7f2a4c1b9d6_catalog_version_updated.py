@@ -0,0 +1,26 @@
+"""catalog version timestamp
+
+Revision ID: e7f2a4c1b9d6
+Revises: c41b9e27f5a3
+Create Date: 2026-10-18 15:21:09.664301
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7f2a4c1b9d6'
+down_revision = 'c41b9e27f5a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('catalog_version', sa.Column('updated', sa.DateTime(), nullable=True))
+    op.execute(sa.text("UPDATE catalog_version SET updated = CURRENT_TIMESTAMP"))
+
+
+def downgrade():
+    with op.batch_alter_table('catalog_version') as batch_op:
+        batch_op.drop_column('updated')
@@ -0,0 +1,35 @@
+"""order status events
+
+Revision ID: f3c8d5e2a7b1
+Revises: e7f2a4c1b9d6
+Create Date: 2026-10-18 17:02:44.310527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8d5e2a7b1'
+down_revision = 'e7f2a4c1b9d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_events',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('order_id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('status', sa.Integer(), nullable=False),
+                    sa.Column('created', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_order_events_user_id_id', 'order_events', ['user_id', 'id'], unique=False)
+    op.create_index(op.f('ix_order_events_created'), 'order_events', ['created'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_order_events_created'), table_name='order_events')
+    op.drop_index('ix_order_events_user_id_id', table_name='order_events')
+    op.drop_table('order_events')
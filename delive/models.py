@@ -1,11 +1,13 @@
 from datetime import datetime
 
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import ForeignKey
-from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+import delive.passwords as passwords
+from delive.routing import RoutingSQLAlchemy
+
+# чтение в обработчиках с routing.read_only идёт из реплики (если она настроена)
+db = RoutingSQLAlchemy()
 migrate = Migrate()
 
 
@@ -36,17 +38,23 @@ class User(db.Model):
     def password(self):
         raise AttributeError("Вам не нужно знать пароль!")
     
+    # хэш вычисляется в отдельном пуле процессов (delive.passwords)
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
     
     def password_valid(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
+    
+    # хэш создан с устаревшими параметрами
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.password_hash)
 
 
 dishes_orders = db.Table('dishes_orders',
-                         db.Column('dish_id', db.Integer, db.ForeignKey('dishes.id')),
-                         db.Column('order_id', db.Integer, db.ForeignKey('orders.id'))
+                         db.Column('dish_id', db.Integer, db.ForeignKey('dishes.id'), nullable=False, index=True),
+                         db.Column('order_id', db.Integer, db.ForeignKey('orders.id'), nullable=False),
+                         db.PrimaryKeyConstraint('order_id', 'dish_id', name='dishes_orders_pkey')
                          )
 
 
@@ -58,7 +66,7 @@ class Dish(db.Model):
     description = db.Column(db.Text, nullable=False)
     picture = db.Column(db.String(50), default="")
     
-    category_id = db.Column(db.Integer, ForeignKey('categories.id'), nullable=False)
+    category_id = db.Column(db.Integer, ForeignKey('categories.id'), nullable=False, index=True)
     category = db.relationship("Category", back_populates='dishes')
     orders = db.relationship('Order', secondary=dishes_orders, back_populates='dishes')
 
@@ -74,14 +82,66 @@ class Category(db.Model):
 class Order(db.Model):
     __tablename__ = 'orders'
     id = db.Column(db.Integer, primary_key=True)
-    created = db.Column(db.String(20), default=showdate())
+    created = db.Column(db.String(20), default=showdate)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     name = db.Column(db.String(30), nullable=False)
     total = db.Column(db.Integer, default=0)
     # status: 0 - accepted, 1 - is being prepared, 2 - is shipped, 3 - is delivered
-    status = db.Column(db.Integer, default=0)
+    status = db.Column(db.Integer, default=0, index=True)
     phone = db.Column(db.String(15), nullable=False)
     email = db.Column(db.String(30), nullable=False)
     delivery_address = db.Column(db.String(250), nullable=False)
-    user_id = db.Column(db.Integer, ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, ForeignKey('users.id'), nullable=False, index=True)
     user = db.relationship("User", back_populates='orders')
     dishes = db.relationship('Dish', secondary=dishes_orders, back_populates='orders')
+
+
+# Версия каталога: увеличивается при каждом изменении блюд или категорий
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Серверные сессии: в cookie передаётся только идентификатор
+class StoredSession(db.Model):
+    __tablename__ = 'sessions'
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# События изменения статуса заказов для уведомления покупателей (delive.events)
+class OrderEvent(db.Model):
+    __tablename__ = 'order_events'
+    __table_args__ = (db.Index('ix_order_events_user_id_id', 'user_id', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.Integer, nullable=False)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+# Продажи за день (UTC) по статусам заказов; обновляются при оформлении и изменении заказов (delive.sales)
+class DailySales(db.Model):
+    __tablename__ = 'daily_sales'
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.Integer, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Integer, nullable=False, default=0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Счётчики заказов блюд: всего и по дням за последние дни (delive.popularity)
+class DishPopularity(db.Model):
+    __tablename__ = 'dish_popularity'
+    dish_id = db.Column(db.Integer, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DishPopularityDaily(db.Model):
+    __tablename__ = 'dish_popularity_daily'
+    dish_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
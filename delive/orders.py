@@ -0,0 +1,65 @@
+from sqlalchemy import DateTime, Integer, bindparam, text
+from sqlalchemy.orm import selectinload
+
+from delive.models import db, Order
+import delive.events as events
+import delive.sales as sales
+
+# статусы заказа: 0 - принят, 1 - готовится, 2 - доставляется, 3 - доставлен
+DELIVERED = 3
+# больше id в одном изменении статуса не принимается
+MAX_BATCH = 500
+
+
+# Страница истории заказов пользователя, начиная с самых новых.
+# Постраничный вывод по ключу: следующая страница - заказы с id меньше before.
+# Блюда загружаются одним дополнительным запросом на всю страницу.
+def order_history(user_id, before=None, page_size=20):
+    query = db.session.query(Order).filter(Order.user_id == user_id)
+    if before:
+        query = query.filter(Order.id < before)
+    
+    orders = query.options(selectinload(Order.dishes)).order_by(Order.id.desc()).limit(page_size + 1).all()
+    
+    # id последнего заказа страницы, если есть ещё заказы
+    next_before = orders[page_size - 1].id if len(orders) > page_size else None
+    return orders[:page_size], next_before
+
+
+# Статус меняется только на следующий: 0 -> 1 -> 2 -> 3
+def valid_transition(expected, status):
+    return 0 <= expected < DELIVERED and status == expected + 1
+
+
+# Перевод заказов из статуса expected в status одним оператором UPDATE.
+# Заказы, статус которых уже другой, не меняются. Сводка продаж и события для покупателей
+# обновляются в той же транзакции; фиксирует её вызывающий код. Возвращает id изменённых заказов.
+def advance_status(order_ids, expected, status):
+    if not valid_transition(expected, status):
+        raise ValueError(f"Недопустимый переход статуса: {expected} -> {status}")
+    order_ids = sorted(set(order_ids))
+    if not order_ids:
+        return []
+    if len(order_ids) > MAX_BATCH:
+        raise ValueError(f"Не больше {MAX_BATCH} заказов за раз")
+    
+    params = {"ids": order_ids, "expected": expected, "status": status}
+    if db.engine.dialect.name in ("postgresql", "sqlite"):
+        # изменённые строки возвращает сам UPDATE (SQLite - с версии 3.35)
+        rows = db.session.execute(
+            text("UPDATE orders SET status = :status WHERE id IN :ids AND status = :expected "
+                 "RETURNING id, user_id, total, created_at")
+            .bindparams(bindparam("ids", expanding=True))
+            .columns(id=Integer, user_id=Integer, total=Integer, created_at=DateTime),
+            params).fetchall()
+    else:
+        table = Order.__table__
+        condition = table.c.id.in_(order_ids) & (table.c.status == expected)
+        rows = db.session.execute(
+            table.select().with_only_columns([table.c.id, table.c.user_id, table.c.total, table.c.created_at])
+            .where(condition).with_for_update()).fetchall()
+        db.session.execute(table.update().where(table.c.id.in_([row.id for row in rows])).values(status=status))
+    
+    sales.record_status_change(rows, expected, status)
+    events.publish_many([(row.id, row.user_id) for row in rows], status)
+    return [row.id for row in rows]
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+
+# Пул вычисления хэшей занят: в очереди уже максимальное число запросов,
+# хэш не вычислен за settings["timeout"] секунд или процесс пула аварийно завершился
+class PasswordPoolBusy(Exception):
+    pass
+
+
+# Параметры по умолчанию; переопределяются из конфигурации в init_app
+settings = {
+    "method": "pbkdf2:sha256:150000",
+    "salt_length": 16,
+    "workers": 2,
+    "queue_limit": 8,
+    "timeout": 10,
+}
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_pid = None
+
+
+# Пул процессов создаётся лениво в каждом процессе gunicorn (после fork)
+def _get_executor():
+    global _executor, _slots, _pid
+
+    with _lock:
+        if _executor is None or _pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=settings["workers"],
+                                            mp_context=multiprocessing.get_context("forkserver"))
+            _slots = threading.BoundedSemaphore(settings["workers"] + settings["queue_limit"])
+            _pid = os.getpid()
+        return _executor, _slots
+
+
+# Выполнение функции в пуле процессов. Если пул и очередь заполнены,
+# запрос сразу отклоняется, а не ждёт, занимая процесс веб-сервера.
+def _run(fn, *args):
+    if not settings["workers"]:
+        return fn(*args)
+
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise PasswordPoolBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        _reset(executor)
+        raise PasswordPoolBusy()
+    except BaseException:
+        slots.release()
+        raise
+    # место в очереди освобождается, когда задача действительно завершилась (а не по таймауту ожидания)
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=settings["timeout"])
+    except TimeoutError:
+        raise PasswordPoolBusy()
+    except BrokenProcessPool:
+        _reset(executor)
+        raise PasswordPoolBusy()
+
+
+# Пул с аварийно завершившимся процессом (например, по нехватке памяти) больше не принимает задачи:
+# он сбрасывается и будет создан заново при следующем обращении
+def _reset(executor):
+    global _executor
+
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+# Остановка пула (пул будет создан заново при следующем обращении)
+def shutdown():
+    global _executor
+
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, settings["method"], settings["salt_length"])
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+# Метод в том виде, в котором werkzeug записывает его в хэш (pbkdf2:sha256 -> pbkdf2:sha256:150000)
+def _stored_method(method):
+    if method.startswith("pbkdf2:"):
+        args = method[7:].split(":")
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{args[0]}:{iterations}"
+    return method
+
+
+# Хэш создан с другими параметрами (метод, число итераций, длина соли) и должен быть пересчитан при входе
+def needs_rehash(password_hash):
+    method, _, rest = password_hash.partition("$")
+    salt = rest.partition("$")[0]
+    if method != _stored_method(settings["method"]):
+        return True
+    return method != "plain" and len(salt) != settings["salt_length"]
+
+
+def init_app(app):
+    settings.update(
+        method=app.config["PASSWORD_HASH_METHOD"],
+        salt_length=app.config["PASSWORD_SALT_LENGTH"],
+        workers=app.config["PASSWORD_POOL_WORKERS"],
+        queue_limit=app.config["PASSWORD_QUEUE_LIMIT"],
+    )
@@ -0,0 +1,150 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, func, text
+
+import delive.catalog as catalog
+from delive.fragments import fragment_bucket
+from delive.models import db, Order, DishPopularity, DishPopularityDaily, dishes_orders
+
+# Окно "хитов" в днях
+WINDOW_DAYS = 7
+CHUNK_SIZE = 1000
+
+_lock = threading.Lock()
+# рейтинг текущего процесса: (версия каталога, интервал кэша) -> кортеж блюд
+_ranking_key = None
+_ranking = ()
+
+
+def window_start(today=None):
+    return (today or datetime.utcnow().date()) - timedelta(days=WINDOW_DAYS - 1)
+
+
+# Прибавление к счётчикам одним оператором на таблицу (строки создаются, если их ещё нет).
+# Строки блокируются в порядке id блюд: два заказа с одними блюдами в разном порядке не взаимоблокируются
+def increment(dish_ids, day):
+    dish_ids = sorted(set(dish_ids))
+    if not dish_ids:
+        return
+    totals = [{"dish_id": dish_id} for dish_id in dish_ids]
+    daily = [{"dish_id": dish_id, "day": day} for dish_id in dish_ids]
+    if db.engine.dialect.name in ("postgresql", "sqlite"):
+        db.session.execute(text(
+            "INSERT INTO dish_popularity (dish_id, orders) VALUES (:dish_id, 1) "
+            "ON CONFLICT (dish_id) DO UPDATE SET orders = dish_popularity.orders + 1"), totals)
+        db.session.execute(text(
+            "INSERT INTO dish_popularity_daily (dish_id, day, orders) VALUES (:dish_id, :day, 1) "
+            "ON CONFLICT (dish_id, day) DO UPDATE SET orders = dish_popularity_daily.orders + 1"), daily)
+        return
+
+    for table, rows in ((DishPopularity.__table__, totals), (DishPopularityDaily.__table__, daily)):
+        for row in rows:
+            condition = and_(*(table.c[name] == value for name, value in row.items()))
+            updated = db.session.execute(table.update().where(condition).values(orders=table.c.orders + 1)).rowcount
+            if not updated:
+                db.session.execute(table.insert().values(orders=1, **row))
+
+
+# Новый заказ: счётчики его блюд увеличиваются в транзакции оформления заказа
+def record_order(order):
+    increment([dish.id for dish in order.dishes], (order.created_at or datetime.utcnow()).date())
+    # изредка удаляем дни, вышедшие из окна
+    if random.random() < 0.01:
+        compact()
+
+
+# Удаление счётчиков за дни до начала окна
+def compact():
+    return db.session.query(DishPopularityDaily).filter(DishPopularityDaily.day < window_start()) \
+        .delete(synchronize_session=False)
+
+
+# id блюд по убыванию числа заказов за окно, затем - за всё время
+def ranked_ids(limit):
+    weekly = db.session.query(DishPopularityDaily.dish_id) \
+        .filter(DishPopularityDaily.day >= window_start()) \
+        .group_by(DishPopularityDaily.dish_id) \
+        .order_by(func.sum(DishPopularityDaily.orders).desc(), DishPopularityDaily.dish_id) \
+        .limit(limit).all()
+    ids = [row[0] for row in weekly]
+    if len(ids) < limit:
+        overall = db.session.query(DishPopularity.dish_id) \
+            .order_by(DishPopularity.orders.desc(), DishPopularity.dish_id).limit(limit * 2).all()
+        ids.extend(row[0] for row in overall if row[0] not in ids)
+    return ids
+
+
+# Хиты для главной страницы. Рейтинг пересчитывается раз в интервал кэша фрагментов
+# (или при смене версии каталога), в остальное время берётся из памяти процесса.
+def top(snapshot, limit=None):
+    global _ranking_key, _ranking
+
+    limit = limit or current_app.config["POPULAR_DISHES_COUNT"]
+    key = (snapshot.version, fragment_bucket(), limit)
+    if _ranking_key == key:
+        return _ranking
+
+    with _lock:
+        if _ranking_key != key:
+            _ranking = tuple(catalog.find_dishes(snapshot, ranked_ids(limit * 2)))[:limit]
+            _ranking_key = key
+        return _ranking
+
+
+# Пересчёт счётчиков по истории заказов порциями по CHUNK_SIZE заказов
+def rebuild():
+    since = window_start()
+    totals = {}
+    daily = {}
+    last_id = 0
+    while True:
+        order_ids = [row[0] for row in db.session.query(Order.id).filter(Order.id > last_id)
+                     .order_by(Order.id).limit(CHUNK_SIZE)]
+        if not order_ids:
+            break
+        last_id = order_ids[-1]
+
+        rows = db.session.query(dishes_orders.c.dish_id, Order.created_at) \
+            .join(Order, Order.id == dishes_orders.c.order_id) \
+            .filter(dishes_orders.c.order_id.in_(order_ids))
+        for dish_id, created_at in rows:
+            totals[dish_id] = totals.get(dish_id, 0) + 1
+            if created_at is not None and created_at.date() >= since:
+                key = (dish_id, created_at.date())
+                daily[key] = daily.get(key, 0) + 1
+
+    db.session.query(DishPopularityDaily).delete(synchronize_session=False)
+    db.session.query(DishPopularity).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(DishPopularity, [{"dish_id": dish_id, "orders": orders}
+                                                     for dish_id, orders in totals.items()])
+    db.session.bulk_insert_mappings(DishPopularityDaily, [{"dish_id": dish_id, "day": day, "orders": orders}
+                                                          for (dish_id, day), orders in daily.items()])
+    db.session.commit()
+    return len(totals), len(daily)
+
+
+popularity_cli = AppGroup("popularity", help="Счётчики популярности блюд")
+
+
+@popularity_cli.command("rebuild")
+def rebuild_command():
+    """Пересчёт счётчиков по всем заказам"""
+    dishes, days = rebuild()
+    click.echo(f"Блюд: {dishes}, строк по дням: {days}")
+
+
+@popularity_cli.command("compact")
+def compact_command():
+    """Удаление счётчиков за дни, вышедшие из окна хитов (запускать по расписанию)"""
+    deleted = compact()
+    db.session.commit()
+    click.echo(f"Удалено строк: {deleted}")
+
+
+def init_app(app):
+    app.cli.add_command(popularity_cli)
@@ -0,0 +1,224 @@
+import cProfile
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, has_request_context, request, session, signals_available
+from flask import before_render_template, request_finished, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# журнал медленных запросов: одна строка JSON на запрос
+slow_log = logging.getLogger("delive.slow")
+# длина SQL в журнале
+MAX_STATEMENT_LENGTH = 2000
+# замеры запроса хранятся в WSGI environ: они начинаются до загрузки сессии
+ENVIRON_KEY = "delive.profile"
+
+# под профилировщиком одновременно выполняется не больше одного запроса процесса
+_profiler_lock = threading.Lock()
+
+
+# Замеры одного запроса: SQL-запросы (число, время, самые долгие, повторы) и время шаблонов
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_started = None
+        # самые долгие запросы: куча из (время, SQL) размером не больше PROFILING_SLOWEST_STATEMENTS
+        self.slowest = []
+        self.statements = {}
+        self.profiler = None
+        self.profile_file = None
+
+    def add_query(self, statement, seconds, keep):
+        self.queries += 1
+        self.db_time += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+        if len(self.slowest) < keep:
+            heapq.heappush(self.slowest, (seconds, statement))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, statement))
+
+    def repeated(self, limit):
+        return sorted(((count, statement) for statement, count in self.statements.items() if count >= limit),
+                      reverse=True)
+
+
+def current_profile():
+    return request.environ.get(ENVIRON_KEY) if has_request_context() else None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    started = getattr(context, "_query_started", None)
+    if profile is not None and started is not None:
+        profile.add_query(statement, time.perf_counter() - started, current_app.config["PROFILING_SLOWEST_STATEMENTS"])
+
+
+def before_render(sender, template, context, **extra):
+    profile = current_profile()
+    if profile is not None:
+        profile.template_started = time.perf_counter()
+
+
+def after_render(sender, template, context, **extra):
+    profile = current_profile()
+    if profile is not None and profile.template_started is not None:
+        profile.template_time += time.perf_counter() - profile.template_started
+        profile.template_started = None
+
+
+# Профилировщик для доли PROFILING_SAMPLE_RATE запросов (если не занят другим запросом процесса)
+def start_profiler(profile, config):
+    if not config["PROFILING_SAMPLE_RATE"] or random.random() >= config["PROFILING_SAMPLE_RATE"]:
+        return
+    if not _profiler_lock.acquire(blocking=False):
+        return
+    if config["PROFILING_PROFILER"] == "pyinstrument" and pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # профилирование уже включено другим инструментом
+            _profiler_lock.release()
+            return
+    profile.profiler = profiler
+
+
+# Остановка профилировщика и запись результата в PROFILING_DIR: .prof (cProfile) или .html (pyinstrument)
+def stop_profiler(profile, duration):
+    profiler = profile.profiler
+    profile.profiler = None
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+
+        directory = current_app.config["PROFILING_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.utcnow():%Y%m%d-%H%M%S}-{request.endpoint or 'none'}-{os.getpid()}-{duration * 1000:.0f}ms"
+        if isinstance(profiler, cProfile.Profile):
+            profile.profile_file = os.path.join(directory, name + ".prof")
+            profiler.dump_stats(profile.profile_file)
+        else:
+            profile.profile_file = os.path.join(directory, name + ".html")
+            with open(profile.profile_file, "w") as f:
+                f.write(profiler.output_html())
+    except OSError:
+        current_app.logger.warning("Не удалось сохранить результат профилирования", exc_info=True)
+    finally:
+        _profiler_lock.release()
+
+
+# Замеры начинаются до создания контекста запроса (WSGI-обёртка приложения), чтобы в них
+# попали загрузка сессии из хранилища и все обработчики before_request
+def wrap_wsgi_app(app):
+    wsgi_app = app.wsgi_app
+
+    def profiled_wsgi_app(environ, start_response):
+        profile = environ[ENVIRON_KEY] = RequestProfile()
+        start_profiler(profile, app.config)
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = profiled_wsgi_app
+
+
+def server_timing(profile, duration):
+    return (f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries", '
+            f'tpl;dur={profile.template_time * 1000:.1f}, app;dur={duration * 1000:.1f}')
+
+
+# Заголовок Server-Timing: всем (all), только администратору (admin) или никому (off)
+def server_timing_allowed(mode):
+    if mode == "all":
+        return True
+    if mode == "admin":
+        user = session.get("user")
+        return bool(user) and user["role"] == 0
+    return False
+
+
+# Вызывается по сигналу request_finished - после всех after_request и сохранения сессии
+def finish_request(sender, response, **extra):
+    profile = current_profile()
+    if profile is None:
+        return response
+
+    config = current_app.config
+    duration = time.perf_counter() - profile.started
+    if profile.profiler is not None:
+        stop_profiler(profile, duration)
+    if server_timing_allowed(config["PROFILING_SERVER_TIMING"]):
+        response.headers["Server-Timing"] = server_timing(profile, duration)
+
+    repeated = profile.repeated(config["PROFILING_REPEATED_QUERIES"])
+    if duration * 1000 >= config["PROFILING_SLOW_REQUEST_MS"] or repeated:
+        slow_log.warning(json.dumps({
+            "time": datetime.utcnow().isoformat(timespec="milliseconds"),
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "queries": profile.queries,
+            "db_ms": round(profile.db_time * 1000, 1),
+            "template_ms": round(profile.template_time * 1000, 1),
+            "slowest": [{"ms": round(seconds * 1000, 1), "sql": statement[:MAX_STATEMENT_LENGTH]}
+                        for seconds, statement in sorted(profile.slowest, reverse=True)],
+            "repeated": [{"count": count, "sql": statement[:MAX_STATEMENT_LENGTH]} for count, statement in repeated],
+            "profile": profile.profile_file,
+        }, ensure_ascii=False))
+    return response
+
+
+# Если ответ не был сформирован (исключение), профилировщик всё равно останавливается
+def teardown_request(exc):
+    profile = current_profile()
+    if profile is not None and profile.profiler is not None:
+        stop_profiler(profile, time.perf_counter() - profile.started)
+
+
+def init_app(app):
+    if not app.config["PROFILING_ENABLED"]:
+        return
+    if app.config["PROFILING_SLOW_LOG"]:
+        handler = logging.FileHandler(app.config["PROFILING_SLOW_LOG"], encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_log.addHandler(handler)
+        slow_log.propagate = False
+    slow_log.setLevel(logging.WARNING)
+
+    # SQL-запросы всех движков (основная БД и реплика) учитываются в замерах текущего запроса
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+    wrap_wsgi_app(app)
+    app.teardown_request(teardown_request)
+    # итоги запроса и время шаблонов - по сигналам Flask (нужен пакет blinker)
+    if signals_available:
+        request_finished.connect(finish_request, app)
+        before_render_template.connect(before_render, app)
+        template_rendered.connect(after_render, app)
+    else:
+        app.logger.warning("Пакет blinker не установлен, замеры запросов не записываются")
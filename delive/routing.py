@@ -0,0 +1,77 @@
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+REPLICA = "replica"
+# параметры пула, которые не применяются к SQLite
+POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "connect_args")
+
+# до какого момента (time.monotonic) реплика считается недоступной
+_replica_down_until = 0.0
+
+
+# Сессия, которая внутри read_only отправляет чтение в реплику.
+# Запись (flush) всегда идёт в основную БД.
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_app_context() and g.get("db_read_only"):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+# Ограничение времени SQL-запроса (DB_STATEMENT_TIMEOUT) действует только в транзакциях веб-запросов
+# (основная БД и реплика); команды CLI, миграции и перестроение сводок выполняются без него
+@event.listens_for(RoutingSession, "after_begin")
+def limit_statement_time(session, transaction, connection):
+    if not has_request_context() or connection.dialect.name != "postgresql":
+        return
+    timeout = current_app.config.get("DB_STATEMENT_TIMEOUT")
+    if timeout:
+        connection.execute(text(f"SET LOCAL statement_timeout = {int(timeout)}"))
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        session_factory = super().create_session(options)
+        session_factory.class_ = RoutingSession
+        return session_factory
+
+    # параметры пула из конфигурации рассчитаны на PostgreSQL, SQLite использует свои
+    def create_engine(self, sa_url, engine_opts):
+        if sa_url.drivername.startswith("sqlite"):
+            engine_opts = {key: value for key, value in engine_opts.items() if key not in POOL_OPTIONS}
+        return super().create_engine(sa_url, engine_opts)
+
+
+def replica_available():
+    return REPLICA in (current_app.config.get("SQLALCHEMY_BINDS") or {}) \
+        and time.monotonic() >= _replica_down_until
+
+
+# Чтение в обработчике идёт из реплики (только GET и HEAD). Если реплика недоступна,
+# обработчик выполняется заново на основной БД, а реплика не используется REPLICA_RETRY_INTERVAL секунд.
+def read_only(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        global _replica_down_until
+
+        if request.method not in ("GET", "HEAD") or not replica_available():
+            return f(*args, **kwargs)
+
+        g.db_read_only = True
+        try:
+            return f(*args, **kwargs)
+        except OperationalError:
+            current_app.logger.warning("Реплика БД недоступна, чтение переключено на основную БД", exc_info=True)
+            _replica_down_until = time.monotonic() + current_app.config["REPLICA_RETRY_INTERVAL"]
+            get_state(current_app).db.session.rollback()
+            g.db_read_only = False
+            return f(*args, **kwargs)
+        finally:
+            g.db_read_only = False
+
+    return decorated_function
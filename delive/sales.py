@@ -0,0 +1,144 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, inspect, text
+
+from delive.models import db, DailySales, Order, dishes_orders
+
+# Вклад заказа в сводку: (день, статус) и сколько прибавить
+Contribution = namedtuple("Contribution", ["day", "status", "orders", "revenue", "items"])
+
+
+def contribution(order, status=None, total=None, items=None, created_at=None, sign=1):
+    created_at = created_at if created_at is not None else order.created_at
+    return Contribution(created_at.date(), int(order.status if status is None else status), sign,
+                        sign * ((order.total if total is None else total) or 0),
+                        sign * (len(order.dishes) if items is None else items))
+
+
+# Прибавление к строке сводки одним оператором (строка создаётся, если её ещё нет)
+def apply(contributions):
+    table = DailySales.__table__
+    dialect = db.engine.dialect.name
+    for c in contributions:
+        values = c._asdict()
+        if dialect in ("postgresql", "sqlite"):
+            db.session.execute(text(
+                "INSERT INTO daily_sales (day, status, orders, revenue, items) "
+                "VALUES (:day, :status, :orders, :revenue, :items) "
+                "ON CONFLICT (day, status) DO UPDATE SET orders = daily_sales.orders + excluded.orders, "
+                "revenue = daily_sales.revenue + excluded.revenue, items = daily_sales.items + excluded.items"),
+                values)
+            continue
+        updated = db.session.execute(
+            table.update().where(table.c.day == c.day).where(table.c.status == c.status).values(
+                orders=table.c.orders + c.orders, revenue=table.c.revenue + c.revenue, items=table.c.items + c.items)
+        ).rowcount
+        if not updated:
+            db.session.execute(table.insert().values(values))
+
+
+# Новый заказ (вызывается до фиксации транзакции, в которой он создан)
+def record_order(order):
+    # время нужно сводке до вставки строки, поэтому задаётся явно
+    if order.created_at is None:
+        order.created_at = datetime.utcnow()
+    apply([contribution(order)])
+
+
+# Изменённый заказ: вклад прежних значений вычитается, новых - прибавляется.
+# Прежние значения берутся из истории атрибутов, поэтому читаются до загрузки блюд (она вызывает flush).
+def record_change(order):
+    state = inspect(order)
+    old = {}
+    for name in ("status", "total", "created_at"):
+        history = state.attrs[name].history
+        old[name] = history.deleted[0] if history.deleted else getattr(order, name)
+    changed = any(state.attrs[name].history.has_changes() for name in old)
+
+    dishes = state.attrs.dishes.history
+    if dishes.has_changes():
+        old_items = len(dishes.unchanged) + len(dishes.deleted)
+    elif changed:
+        old_items = len(order.dishes)
+    else:
+        return
+
+    if old["created_at"] is None:
+        record_order(order)
+        return
+    apply([contribution(order, old["status"], old["total"], old_items, old["created_at"], -1),
+           contribution(order)])
+
+
+# Заказы (строки с id, total и created_at), переведённые из статуса old_status в new_status
+# одним оператором: вклад каждого заказа переносится, строки сводки обновляются по одной на (день, статус)
+def record_status_change(rows, old_status, new_status):
+    rows = [row for row in rows if row.created_at is not None]
+    if not rows:
+        return
+    items = dict(db.session.query(dishes_orders.c.order_id, func.count())
+                 .filter(dishes_orders.c.order_id.in_([row.id for row in rows]))
+                 .group_by(dishes_orders.c.order_id))
+    totals = {}
+    for row in rows:
+        day = row.created_at.date()
+        orders, revenue, count = totals.get(day, (0, 0, 0))
+        totals[day] = (orders + 1, revenue + (row.total or 0), count + items.get(row.id, 0))
+    apply([Contribution(day, status, sign * orders, sign * revenue, sign * count)
+           for day, (orders, revenue, count) in totals.items()
+           for status, sign in ((old_status, -1), (new_status, 1))])
+
+
+# Удаляемый заказ
+def record_delete(order):
+    if order.created_at is not None:
+        apply([contribution(order, sign=-1)])
+
+
+# Сводка за последние days дней: строки по дням (все статусы вместе) и итоги по статусам
+def report(days=30):
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    query = db.session.query(DailySales).filter(DailySales.day >= since)
+
+    by_day = query.with_entities(DailySales.day, func.sum(DailySales.orders), func.sum(DailySales.revenue),
+                                 func.sum(DailySales.items)) \
+        .group_by(DailySales.day).having(func.sum(DailySales.orders) > 0).order_by(DailySales.day.desc()).all()
+    by_status = query.with_entities(DailySales.status, func.sum(DailySales.orders), func.sum(DailySales.revenue),
+                                    func.sum(DailySales.items)) \
+        .group_by(DailySales.status).having(func.sum(DailySales.orders) > 0).order_by(DailySales.status).all()
+    return by_day, by_status
+
+
+# Пересчёт всей сводки по таблице заказов (после ручных правок в БД)
+def rebuild():
+    items = db.session.query(dishes_orders.c.order_id, func.count().label("dish_count")) \
+        .group_by(dishes_orders.c.order_id).subquery()
+    rows = db.session.query(func.date(Order.created_at), Order.status, func.count(Order.id),
+                            func.coalesce(func.sum(Order.total), 0), func.coalesce(func.sum(items.c.dish_count), 0)) \
+        .outerjoin(items, items.c.order_id == Order.id) \
+        .filter(Order.created_at.isnot(None)) \
+        .group_by(func.date(Order.created_at), Order.status).all()
+
+    db.session.query(DailySales).delete(synchronize_session=False)
+    for day, status, orders, revenue, count in rows:
+        if isinstance(day, str):
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        db.session.add(DailySales(day=day, status=status, orders=orders, revenue=revenue, items=count))
+    db.session.commit()
+    return len(rows)
+
+
+sales_cli = AppGroup("sales", help="Сводка продаж по дням")
+
+
+@sales_cli.command("rebuild")
+def rebuild_command():
+    """Пересчёт таблицы daily_sales по всем заказам"""
+    click.echo(f"Строк сводки: {rebuild()}")
+
+
+def init_app(app):
+    app.cli.add_command(sales_cli)
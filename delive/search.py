@@ -0,0 +1,135 @@
+import re
+
+from sqlalchemy import and_, or_, select, literal_column, text
+
+from delive.models import db, Dish
+
+# Слов в запросе учитывается не больше MAX_TERMS
+MAX_TERMS = 8
+
+# PostgreSQL: вычисляемый столбец tsvector со словоформами русского языка и индекс GIN.
+# Столбец пересчитывается самой СУБД при любом изменении блюда (админка, загрузка каталога).
+POSTGRES_DDL = [
+    "ALTER TABLE dishes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_dishes_search_vector ON dishes USING gin (search_vector)",
+]
+
+# SQLite: таблица FTS5 над содержимым dishes, синхронизируется триггерами.
+# Стемминга для русского в FTS5 нет, поэтому слова ищутся по префиксу.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS dishes_fts USING fts5("
+    "title, description, content='dishes', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS dishes_fts_ai AFTER INSERT ON dishes BEGIN "
+    "INSERT INTO dishes_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS dishes_fts_ad AFTER DELETE ON dishes BEGIN "
+    "INSERT INTO dishes_fts (dishes_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS dishes_fts_au AFTER UPDATE ON dishes BEGIN "
+    "INSERT INTO dishes_fts (dishes_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO dishes_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "INSERT INTO dishes_fts (dishes_fts) VALUES ('rebuild')",
+]
+
+
+# Слова запроса (знаки препинания и операторы полнотекстового поиска отбрасываются)
+def terms(query):
+    return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+# Создание поискового индекса для БД, созданной через db.create_all(). Миграция d7a1c3e5f9b2
+# содержит свою копию этих команд: изменение индекса оформляется новой миграцией
+def create_index(engine):
+    ddl = {"postgresql": POSTGRES_DDL, "sqlite": SQLITE_DDL}.get(engine.dialect.name, [])
+    with engine.begin() as conn:
+        for statement in ddl:
+            conn.execute(text(statement))
+
+
+def _fts_match(words, prefix_all=True, column=None):
+    match = " ".join(f'"{word}"*' if prefix_all or i == len(words) - 1 else f'"{word}"'
+                     for i, word in enumerate(words))
+    return f"{column} : ({match})" if column else match
+
+
+# Запрос id блюд по релевантности и общее число найденных: (id, total);
+# None, если у СУБД нет полнотекстового индекса
+def _ranked(words, limit, offset):
+    dialect = db.engine.dialect.name
+    params = {"limit": limit, "offset": offset}
+    if dialect == "postgresql":
+        params["q"] = " ".join(words)
+        return db.session.execute(text(
+            "SELECT id, count(*) OVER () AS total FROM dishes, plainto_tsquery('russian', :q) query "
+            "WHERE search_vector @@ query ORDER BY ts_rank_cd(search_vector, query) DESC, id "
+            "LIMIT :limit OFFSET :offset"), params).fetchall()
+    if dialect == "sqlite":
+        params["q"] = _fts_match(words)
+        # bm25() нельзя вызвать вместе с оконной функцией, поэтому ранг вычисляется во вложенном запросе
+        return db.session.execute(text(
+            "SELECT id, count(*) OVER () AS total FROM (SELECT rowid AS id, bm25(dishes_fts, 10.0, 1.0) AS rank "
+            "FROM dishes_fts WHERE dishes_fts MATCH :q) ORDER BY rank, id LIMIT :limit OFFSET :offset"),
+            params).fetchall()
+    return None
+
+
+# Для СУБД без полнотекстового индекса: LIKE по названию и описанию
+def _like_clause(words):
+    return [or_(Dish.title.ilike(f"%{word}%"), Dish.description.ilike(f"%{word}%")) for word in words]
+
+
+# Поиск блюд: (id блюд страницы в порядке релевантности, всего найдено)
+def search(query, page=1, per_page=20):
+    words = terms(query)
+    if not words:
+        return [], 0
+
+    offset = (page - 1) * per_page
+    rows = _ranked(words, per_page, offset)
+    if rows is not None:
+        return [row.id for row in rows], (rows[0].total if rows else 0)
+
+    found = db.session.query(Dish.id).filter(*_like_clause(words))
+    return [row.id for row in found.order_by(Dish.id).limit(per_page).offset(offset)], found.count()
+
+
+# Подсказки при вводе: блюда, в названии которых есть все слова (последнее - по началу слова)
+def suggest(query, limit=8):
+    words = terms(query)
+    if not words:
+        return []
+
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        tsquery = " & ".join(words) + ":*"
+        return db.session.execute(text(
+            "SELECT id, title FROM dishes, to_tsquery('russian', :q) query "
+            "WHERE search_vector @@ query ORDER BY ts_rank_cd(search_vector, query, 1) DESC, id LIMIT :limit"),
+            {"q": tsquery, "limit": limit}).fetchall()
+    if dialect == "sqlite":
+        return db.session.execute(text(
+            "SELECT d.id, d.title FROM dishes_fts JOIN dishes d ON d.id = dishes_fts.rowid "
+            "WHERE dishes_fts MATCH :q ORDER BY bm25(dishes_fts, 10.0, 1.0), d.id LIMIT :limit"),
+            {"q": _fts_match(words, prefix_all=False, column="title"), "limit": limit}).fetchall()
+
+    return db.session.query(Dish.id, Dish.title).filter(*[Dish.title.ilike(f"%{word}%") for word in words]) \
+        .order_by(Dish.title).limit(limit).all()
+
+
+# Условие отбора блюд по запросу для админки (без сортировки по релевантности)
+def matching_clause(query):
+    words = terms(query)
+    if not words:
+        return None
+
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return literal_column("dishes.search_vector").op("@@")(
+            text("plainto_tsquery('russian', :search_query)").bindparams(search_query=" ".join(words)))
+    if dialect == "sqlite":
+        matching = select([literal_column("rowid")]).select_from(text("dishes_fts")) \
+            .where(text("dishes_fts MATCH :search_query").bindparams(search_query=_fts_match(words)))
+        return Dish.id.in_(matching)
+    return and_(*_like_clause(words))
@@ -0,0 +1,171 @@
+import random
+import secrets
+from datetime import datetime
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import create_engine
+from werkzeug.datastructures import CallbackDict
+
+from delive.models import db, StoredSession
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+# Сессия, данные которой хранятся на сервере, а в cookie передаётся только её идентификатор
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # пользователь на момент загрузки: при входе и выходе сессия получает новый идентификатор
+        self.loaded_user = self.get("user")
+
+
+# Хранилище сессий в таблице sessions (основная БД или отдельный файл SQLite)
+class SqlSessionStore:
+    def __init__(self, engine, create_table=False):
+        self.engine = engine
+        self.table = StoredSession.__table__
+        if create_table:
+            self.table.create(engine, checkfirst=True)
+
+    def load(self, sid):
+        row = self.engine.execute(
+            self.table.select().where(self.table.c.id == sid).where(self.table.c.expires > datetime.utcnow())
+        ).first()
+        return row.data if row else None
+
+    def save(self, sid, data, lifetime):
+        expires = datetime.utcnow() + lifetime
+        with self.engine.begin() as conn:
+            updated = conn.execute(
+                self.table.update().where(self.table.c.id == sid).values(data=data, expires=expires)
+            ).rowcount
+            if not updated:
+                conn.execute(self.table.insert().values(id=sid, data=data, expires=expires))
+
+            # изредка удаляем просроченные сессии
+            if random.random() < 0.01:
+                conn.execute(self.table.delete().where(self.table.c.expires <= datetime.utcnow()))
+
+    def delete(self, sid):
+        self.engine.execute(self.table.delete().where(self.table.c.id == sid))
+
+
+# Хранилище сессий в Redis (или совместимом сервере)
+class RedisSessionStore:
+    prefix = "session:"
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("Для хранения сессий в Redis необходимо установить пакет redis")
+        self.client = redis.Redis.from_url(url)
+
+    def load(self, sid):
+        data = self.client.get(self.prefix + sid)
+        return data.decode() if data else None
+
+    def save(self, sid, data, lifetime):
+        self.client.setex(self.prefix + sid, lifetime, data)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+
+# Префиксы путей, для которых серверная сессия не загружается (см. no_session)
+_sessionless_prefixes = []
+
+
+# Обработчики под этим префиксом не используют сессию: запрос не обращается к хранилищу сессий
+def no_session(prefix):
+    _sessionless_prefixes.append(prefix)
+
+
+class ServerSessionInterface(SessionInterface):
+    salt = "delive-session"
+
+    def __init__(self):
+        self._store = None
+
+    # Хранилище создаётся при первом обращении, когда уже есть контекст приложения
+    def get_store(self, app):
+        if self._store is None:
+            backend = app.config["SESSION_BACKEND"]
+            if backend == "redis":
+                self._store = RedisSessionStore(app.config["SESSION_REDIS_URL"])
+            elif app.config["SESSION_DB_URI"]:
+                self._store = SqlSessionStore(create_engine(app.config["SESSION_DB_URI"]), create_table=True)
+            else:
+                self._store = SqlSessionStore(db.engine)
+        return self._store
+
+    def get_signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        # для статических файлов сессия не загружается
+        if app.static_url_path and request.path.startswith(app.static_url_path + "/"):
+            return None
+        if request.path.startswith(tuple(_sessionless_prefixes)):
+            return None
+
+        cookie = request.cookies.get(app.session_cookie_name)
+        if cookie:
+            try:
+                sid = self.get_signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.get_store(app).load(sid)
+                if data is not None:
+                    return ServerSession(session_json_serializer.loads(data), sid=sid)
+
+        return ServerSession(sid=secrets.token_urlsafe(24), new=True)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # пустая сессия удаляется вместе с cookie
+        if not session:
+            if session.modified and not session.new:
+                self.get_store(app).delete(session.sid)
+                response.delete_cookie(app.session_cookie_name, domain=domain, path=path)
+            return
+
+        if not session.modified:
+            return
+
+        # вход, регистрация или выход: старый идентификатор (возможно, навязанный чужой ссылкой
+        # или cookie) удаляется, сессия сохраняется под новым
+        if not session.new and session.get("user") != session.loaded_user:
+            self.get_store(app).delete(session.sid)
+            session.sid = secrets.token_urlsafe(24)
+
+        data = session_json_serializer.dumps(dict(session))
+        self.get_store(app).save(session.sid, data, app.permanent_session_lifetime)
+
+        response.set_cookie(
+            app.session_cookie_name,
+            self.get_signer(app).sign(session.sid.encode()).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+# Подключение серверных сессий (SESSION_BACKEND = "cookie" оставляет стандартные сессии Flask)
+def init_app(app):
+    if app.config["SESSION_BACKEND"] != "cookie":
+        app.session_interface = ServerSessionInterface()
@@ -1,5 +1,4 @@
 from functools import wraps
-import random
 from hashlib import md5
 
 import flask_migrate
@@ -7,9 +6,20 @@ from flask import abort, flash, session, redirect, request, render_template, url
 from sqlalchemy.exc import OperationalError, ProgrammingError
 
 from delive import app, db
-from delive.models import User, Dish, Order, Category
+from delive.models import User, Order
 import delive.forms as forms
-import delive.config as config
+import delive.catalog as catalog
+import delive.cart as carts
+import delive.orders as orders
+import delive.importer as importer
+import delive.passwords as passwords
+import delive.conditional as conditional
+import delive.events as events
+import delive.sales as sales
+import delive.popularity as popularity
+import delive.search as search
+import delive.metrics as metrics
+from delive.routing import read_only
 
 
 # Декораторы авторизации
@@ -37,11 +47,7 @@ def admin_only(f):
 # фильтр для случайного отбора элементов по категории
 @app.template_filter('sample')
 def sample_filter(items, items_count):
-    if items and len(items) > items_count:
-        random.seed()
-        return random.sample(items, items_count)
-    else:
-        return items
+    return catalog.sample(items, items_count)
 
 
 # Фильтр для форматированного вывода статуса заказа
@@ -54,34 +60,49 @@ def getstatus_filter(value):
 
 
 @app.route('/')
+@read_only
+@conditional.catalog_conditional
 def home():
-    # Загрузка данных
-    categories = db.session.query(Category).all()
-    dishes = db.session.query(Dish).all()
+    # Данные берутся из снимка каталога в памяти процесса; блюда рядов отбираются
+    # только при промахе кэша фрагментов (catalog.row_sampler)
+    snapshot = catalog.get_snapshot()
     
-    return render_template("main.html", dishes=dishes, categories=categories)
+    return render_template("main.html", row_dishes=catalog.row_sampler(snapshot, 3), categories=snapshot.categories,
+                           catalog_version=snapshot.version, popular=popularity.top(snapshot))
+
+
+# Поиск блюд по названию и описанию, результаты по релевантности
+@app.route('/search/')
+@read_only
+def search_dishes():
+    query = request.args.get("q", "").strip()
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = app.config["SEARCH_PAGE_SIZE"]
+    
+    dish_ids, total = search.search(query, page, per_page)
+    found = catalog.find_dishes(catalog.get_snapshot(), dish_ids)
+    
+    return render_template("search.html", query=query, dishes=found, total=total, page=page,
+                           has_next=page * per_page < total)
 
 
 # Страница корзины
 @app.route('/cart/', methods=['GET', 'POST'])
+@read_only
 def show_cart():
-    cart = session.get("cart", [])
     form = forms.OrderForm()
     
     # Если данные не были отправлены или не прошли валидацию
     if request.method != "POST" or not form.validate_on_submit():
-        dishes = []
-        if cart:
-            for c in cart:
-                dish = db.session.query(Dish).get(c)
-                if dish:
-                    dishes.append(dish)
+        # Все блюда корзины загружаются одним запросом, сумма пересчитывается по ценам из БД
+        priced = carts.price_cart(session.get("cart", []))
+        carts.store(priced)
         
         # снова показываем  страницу корзины
         if session.get("user", None):
             form.clientEmail.data = session["user"]["email"]
         
-        return render_template("cart.html", dishes=dishes, form=form)
+        return render_template("cart.html", dishes=priced.dishes, form=form)
     
     u = session.get("user", None)
     if not u:
@@ -96,20 +117,20 @@ def show_cart():
     
     # сохраняем данные
     try:
+        priced = carts.price_cart(session.get("cart", []))
         order = Order(name=client_name, phone=client_phone, delivery_address=client_address, email=client_email,
-                      total=session.get("total", 0), status=0, user_id=u["id"])
-        for dish_id in cart:
-            dish = db.session.query(Dish).get(dish_id)
-            if dish:
-                order.dishes.append(dish)
+                      total=priced.total, status=0, user_id=u["id"])
+        order.dishes.extend(priced.dishes)
         
         db.session.add(order)
+        # сводка продаж за день и счётчики популярности блюд обновляются в той же транзакции
+        sales.record_order(order)
+        popularity.record_order(order)
         db.session.commit()
+        metrics.record_checkout(order)
         
         # Обнуляем данные корзины в сессии
-        session["total"] = 0
-        session["cart"] = []
-        session["count"] = 0
+        carts.clear()
     
     except (OperationalError, ProgrammingError):
         return render_template('error.html', text="К сожалению, на сайте произошла неустранимая ошибка"), 500
@@ -121,30 +142,24 @@ def show_cart():
 # Добавление в корзину
 @app.route('/addtocart/<int:dish_id>/')
 def render_addtocart(dish_id):
+    # Получаем либо значение из сессии, либо пустой список
+    cart = session.get("cart", [])
     
+    # Новое блюдо и блюда корзины загружаются одним запросом
     try:
-        item = db.session.query(Dish).get(dish_id)
+        priced = carts.price_cart(cart + [dish_id])
     except (OperationalError, ProgrammingError):
         return render_template('error.html', text="К сожалению, на сайте произошла неустранимая ошибка"), 500
     
-    if not item:
+    if dish_id not in (dish.id for dish in priced.dishes):
         return render_template('error.html', text="К сожалению, данного товара в нашей базе данных нет"), 404
     
-    # Получаем либо значение из сессии, либо пустой список
-    cart = session.get("cart", [])
-    
-    # Добавлям элемент в список
-    if cart:
-        if item.id in cart:
-            flash('Вы не можете добавлять в корзину два и более одинаковых товара')
-            return redirect("/")
-    
-    cart.append(item.id)
-    
     # Записываем список обратно в сессию
-    session['cart'] = cart
-    session['total'] = session.get("total", 0) + item.price
-    session['count'] = len(cart)
+    carts.store(priced)
+    
+    if dish_id in cart:
+        flash('Вы не можете добавлять в корзину два и более одинаковых товара')
+        return redirect("/")
     
     return redirect(url_for("show_cart"))
 
@@ -155,21 +170,11 @@ def delete_dish(dish_id):
     cart = session.get("cart", [])
     
     if cart and dish_id in cart:
-        dish = db.session.query(Dish).get(dish_id)
-        if dish:
-            cart.remove(dish_id)
-            total = session.get("total", 0) - dish.price
-            count = session.get("total", 0) - 1
-            flash(f'Товар {dish.title} удален из корзины')
-            
-            if total < 0 or count < 0 or not cart:
-                session['total'] = 0
-                session['cart'] = []
-                session['count'] = 0
-            else:
-                session['total'] = total
-                session['cart'] = cart
-                session['count'] = count
+        priced = carts.price_cart(cart)
+        for dish in priced.dishes:
+            if dish.id == dish_id:
+                flash(f'Товар {dish.title} удален из корзины')
+        carts.store(carts.without(priced, dish_id))
     
     return redirect(url_for("show_cart"))
 
@@ -184,12 +189,36 @@ def render_account():
     
     user = User.query.get(u["id"])
     if user:
-        return render_template("account.html", user=user, change_password=False)
+        # Первая страница истории заказов (или страница после before, если нет JavaScript)
+        user_orders, next_before = orders.order_history(user.id, request.args.get("before", type=int),
+                                                        app.config["ACCOUNT_ORDERS_PAGE_SIZE"])
+        return render_template("account.html", user=user, orders=user_orders, next_before=next_before,
+                               change_password=False)
     
     flash("Произошла ошибка с вашей учетной записью. Выйдите и войдите снова или пройдите регистрацию")
     return redirect("/")
 
 
+# Следующая страница истории заказов для кнопки "Показать ещё"
+@app.route('/account/orders/')
+@login_required
+def account_orders():
+    user_orders, next_before = orders.order_history(session["user"]["id"], request.args.get("before", type=int),
+                                                    app.config["ACCOUNT_ORDERS_PAGE_SIZE"])
+    return render_template("orders_list.html", orders=user_orders, next_before=next_before)
+
+
+# Поток событий об изменении статуса заказов пользователя (Server-Sent Events)
+@app.route('/account/events/')
+@login_required
+def account_events():
+    def describe(event):
+        return {"order": event.order_id, "status": event.status, "text": getstatus_filter(event.status)}
+    
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    return events.stream_response(session["user"]["id"], last_event_id, describe)
+
+
 # Страница админки
 @app.route('/admin/')
 @admin_only
@@ -210,6 +239,14 @@ def login():
     if request.method == "POST" and form.validate_on_submit():
         user = User.query.filter_by(email=form.username.data).first()
         if user and user.password_valid(form.password.data):
+            # Параметры хэширования изменились - пересчитываем хэш пароля
+            if user.password_needs_rehash():
+                try:
+                    user.password = form.password.data
+                    db.session.commit()
+                except passwords.PasswordPoolBusy:
+                    pass
+            
             session["user"] = {
                 "id": user.id,
                 "email": user.email,
@@ -321,42 +358,14 @@ def upgrade_db(page):
     return redirect(url_for('render_account'))
 
 
-# Загрузка данных в пустую базу данных
+# Загрузка данных в базу данных (повторная загрузка обновляет существующие записи).
+# Уменьшенные копии изображений создаются при первом обращении или командой flask images build
 @app.route('/loaddb/')
 @admin_only
 def load_db():
-    # Загрузка данных
-    try:
-        with open(f'{config.current_path}/data/source_data.csv', 'r') as f:
-            content = f.read()
-    except FileNotFoundError:
-        content = None
-    if content:
-        lst = content.split('\n')
-        if len(lst) > 1:
-            for value in lst[1:]:
-                items = value.split('|')
-                if items and len(items) > 5:
-                    dish = Dish(id=int(items[0]), title=items[1], price=int(items[2]), description=items[3],
-                                picture=items[4], category_id=int(items[5]))
-                    db.session.add(dish)
-    
-    try:
-        with open(f'{config.current_path}/data/category.csv', 'r') as f:
-            content = f.read()
-    except FileNotFoundError:
-        content = None
-    
-    if content and len(content) > 1:
-        lst = content.split('\n')
-        if len(lst) > 1:
-            for value in lst[1:]:
-                items = value.split('|')
-                if items and len(items) > 1:
-                    cat = Category(id=int(items[0]), title=items[1])
-                    db.session.add(cat)
-    
-    db.session.commit()
+    for result in importer.import_catalog(build_images=False):
+        if result.errors:
+            flash(f'{result.table}: строк с ошибками - {len(result.errors)}')
     
     return redirect(url_for('home'))
 
@@ -366,6 +375,19 @@ def render_not_found(error):
     return render_template('error.html', text="Ничего не нашлось!"), 404
 
 
+# Пул хэширования паролей перегружен
+@app.errorhandler(passwords.PasswordPoolBusy)
+def render_password_pool_busy(error):
+    return render_template('error.html',
+                           text="Сервер перегружен, повторите попытку через несколько секунд"), 503
+
+
+# Заняты все подключения к потоку событий в этом процессе
+@app.errorhandler(events.EventStreamBusy)
+def render_event_stream_busy(error):
+    return "Сервер перегружен, повторите попытку позже", 503, {"Retry-After": "30"}
+
+
 @app.errorhandler(500)
 def render_server_error(error):
     return render_template('error.html',
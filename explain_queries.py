@@ -0,0 +1,50 @@
+# Планы выполнения основных запросов сайта.
+# python explain_queries.py            - планы для текущей схемы БД
+# python explain_queries.py --upgrade  - планы до и после применения миграций
+import argparse
+
+import flask_migrate
+from sqlalchemy import text
+
+from delive import app, db
+
+HOT_QUERIES = [
+    ("История заказов в личном кабинете",
+     "SELECT * FROM orders WHERE user_id = :user_id ORDER BY id DESC LIMIT 21"),
+    ("Блюда заказов страницы кабинета",
+     "SELECT dishes.*, dishes_orders.order_id FROM dishes "
+     "JOIN dishes_orders ON dishes.id = dishes_orders.dish_id WHERE dishes_orders.order_id IN (:order_id, :order_id2)"),
+    ("Заказы, содержащие блюдо",
+     "SELECT order_id FROM dishes_orders WHERE dish_id = :dish_id"),
+    ("Блюда категории",
+     "SELECT * FROM dishes WHERE category_id = :category_id"),
+    ("Заказы в статусе (фильтр админки)",
+     "SELECT * FROM orders WHERE status = :status ORDER BY id DESC LIMIT 50"),
+]
+
+PARAMS = {"user_id": 1, "order_id": 1, "order_id2": 2, "dish_id": 1, "category_id": 1, "status": 0}
+
+
+def print_plans(title):
+    print(f"===== {title} =====")
+    prefix = "EXPLAIN" if db.engine.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN"
+    for name, sql in HOT_QUERIES:
+        print(f"\n-- {name}\n{sql}")
+        for row in db.session.execute(text(f"{prefix} {sql}"), PARAMS):
+            print("   ", " ".join(str(value) for value in row))
+    print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Планы выполнения основных запросов")
+    parser.add_argument("--upgrade", action="store_true", help="показать планы до и после миграции")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.upgrade:
+            print_plans("До миграции")
+            db.session.rollback()
+            flask_migrate.upgrade()
+            print_plans("После миграции")
+        else:
+            print_plans("Текущая схема")
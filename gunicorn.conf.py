@@ -0,0 +1,23 @@
+# Настройки gunicorn (файл из текущей папки читается автоматически)
+import os
+import shutil
+import tempfile
+
+# Метрики Prometheus (/metrics) из всех процессов собираются через файлы в этой папке.
+# Переменная задаётся до загрузки приложения в процессах, поэтому prometheus_client включает режим нескольких процессов
+metrics_dir = os.environ.setdefault("prometheus_multiproc_dir", os.path.join(tempfile.gettempdir(), "delive-metrics"))
+
+
+# Значения от предыдущего запуска не суммируются с новыми
+def on_starting(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+# Показатели завершившегося процесса (пулы соединений) больше не учитываются
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)